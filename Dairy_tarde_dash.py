@@ -1,196 +1,221 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-import calendar
-
-# Corrected caching decorator
-@st.cache
-def load_data(url):
-    return pd.read_csv(url)
+import threading
+import aggregates
+import comparison
+import figures
+import forecasting
+import instrumentation
+import sections
+import snapshots
+import views
+from loaders import load_all, as_loaded, dataset_version, dataset_partitions, changed_partitions, partition_version
+
+# Derived structures are rebuilt only when their source dataset is reloaded
+@st.cache_resource
+def partner_cube_state():
+    return {'lock': threading.Lock()}
+
+def load_partner_cube(imports_data, exports_data):
+    """Partner cube, re-aggregating only the years whose trade partitions changed since the last build."""
+    state = partner_cube_state()
+    version = dataset_version(*views.TRADE_DATASETS.values())
+    with state['lock']:
+        if state.get('version') != version:
+            datasets = {'Imports': imports_data, 'Exports': exports_data}
+            changed = {key for name in views.TRADE_DATASETS.values()
+                       for key in changed_partitions(name, state.get('partitions', {}).get(name, {}))}
+            if 'cube' not in state:
+                state['cube'] = aggregates.build_partner_cube(datasets)
+            elif changed:
+                state['cube'] = aggregates.update_partner_cube(state['cube'], datasets, [int(key) for key in changed])
+            state['version'] = version
+            state['partitions'] = {name: dataset_partitions(name) for name in views.TRADE_DATASETS.values()}
+        return state['cube']
+
+# `_data` arguments are not hashed; `version` (from dataset_version) stands in for them
+@st.cache_resource(max_entries=2)
+def load_forecast_index(_data, version):
+    return aggregates.build_forecast_index(_data)
+
+@st.cache_resource(max_entries=2)
+def load_partner_ranges(_data, version):
+    return views.partner_ranges(_data)
+
+@st.cache_resource(max_entries=2)
+def load_product_group_ranges(_data, version):
+    return views.product_group_ranges(_data)
+
+@st.cache_resource(max_entries=2)
+def load_comparison_matrix(_frames, version):
+    return comparison.build_matrix(comparison.long_table(_frames))
+
+# Figures come from the pre-rendered snapshots (see snapshots.py) while they
+# match the loaded data, and are built live otherwise
+def snapshot_or_build(view, params, build):
+    return snapshots.lookup(view, params) or build()
 
 # Plot data
-def plot_data(data, title, color):
-    st.subheader(title)
-    filtered_data = data[(data['ProductGroup'] == selected_product_group) & (data['year'] == selected_year)]
-    summary = filtered_data.groupby('Partner')['Quantityintonnes'].sum().reset_index()
-    summary = summary.sort_values(by='Quantityintonnes', ascending=False)
-    if selected_max_results != 'No Limit':
-        summary = summary.head(int(selected_max_results))
-    chart = px.bar(summary, x='Quantityintonnes', y='Partner', orientation='h', title=title, color_discrete_sequence=[color])
-    st.plotly_chart(chart)
+def plot_data(label, partner_cube, product_group, max_results):
+    st.subheader(views.trade_title(label, product_group, selected_year))
+    params = (label, product_group, selected_year, max_results)
 
-# UI Elements
-year_options = list(range(2023, 2010, -1))
-selected_year = st.selectbox("Select Year", year_options)
-
-# Load Data
-imports_data = load_data("https://raw.githubusercontent.com/sbs24011/Streamlit/main/ireland_imports.csv")
-exports_data = load_data("https://raw.githubusercontent.com/sbs24011/Streamlit/main/ireland_exports.csv")
-ireland_totals_by_partner = load_data("https://raw.githubusercontent.com/sbs24011/Streamlit/main/ireland_totals_by_partner_steamlit.csv")
-ireland_export_partners_2023 = load_data("https://raw.githubusercontent.com/sbs24011/Streamlit/main/ireland_export_partners_2023_steamlit.csv")
-nl_totals_by_partners2023 = load_data("https://raw.githubusercontent.com/sbs24011/Streamlit/main/nl_totals_by_partners2023_steamlit.csv")
-best_prediction_df = load_data("https://raw.githubusercontent.com/sbs24011/Streamlit/main/best_prediction_df_steamlit.csv")
-milk_prices_df = load_data("https://raw.githubusercontent.com/sbs24011/Streamlit/main/milk_prices_df_steamlit.csv")
-ireland_totals_by_product_group = load_data("https://raw.githubusercontent.com/sbs24011/Streamlit/main/ireland_totals_by_product_group_steamlit.csv")
-
-# Ensure data is loaded
-if imports_data is not None and exports_data is not None:
+    # Keyed on the selected year's partition, so appending other years keeps this chart cached
+    inputs = (*params, partition_version(views.TRADE_DATASETS[label], selected_year))
+    figures.plotly_chart_json(sections.memoized(f"trade-{label}", inputs, lambda: snapshot_or_build(
+        'trade', params, lambda: views.trade_chart(partner_cube, *params))))
+
+def trade_section(data):
+    imports_data, exports_data = data['imports_data'], data['exports_data']
     st.header("Ireland's Dairy Trade Analysis")
+    partner_cube = load_partner_cube(imports_data, exports_data)
 
     product_groups = imports_data['ProductGroup'].unique()
     selected_product_group = st.selectbox("Select Product Group", product_groups)
-    selected_max_results = st.selectbox("Select Maximum Results per Plot", ['No Limit', '5', '10', '20'])  
-    import_export_selected = st.multiselect("Select Dataset to Display", ['Imports', 'Exports'], default=['Imports'])
+    selected_max_results = st.selectbox("Select Maximum Results per Plot", views.MAX_RESULTS)  
+    import_export_selected = st.multiselect("Select Dataset to Display", list(views.TRADE_DATASETS), default=['Imports'])
     
     # Filtering and plotting data
-    if 'Imports' in import_export_selected:
-        plot_data(imports_data, f"Imports of {selected_product_group} in {selected_year}", '#1f77b4')
-    if 'Exports' in import_export_selected:
-        plot_data(exports_data, f"Exports of {selected_product_group} in {selected_year}", '#ff7f0e')
-else:
-    st.error("Failed to load data. Please check the data URLs and format.")
-
-if ireland_totals_by_partner is not None:
+    with sections.timed("trade"):
+        for label in views.TRADE_DATASETS:
+            if label in import_export_selected:
+                plot_data(label, partner_cube, selected_product_group, selected_max_results)
+
+def partner_map_section(data):
+    ireland_totals_by_partner = data['ireland_totals_by_partner']
     st.header("Dynamic map of Irelands export")
     
-    ireland_totals_unique_years = ireland_totals_by_partner['year'].unique()
-    ireland_totals_selected_year = st.select_slider("Select Year", options=ireland_totals_unique_years)
-    
-    filtered_totals_df = ireland_totals_by_partner[
-        (ireland_totals_by_partner['year'] == ireland_totals_selected_year)
-    ]
-    
-    dynamic_ireland_totals_map = px.choropleth(filtered_totals_df,
-                         locations="Alpha-3code_Partner",
-                         title=f"Ireland Export Partners by Value in thousand euro ({ireland_totals_selected_year})",
-                         color="Valueinthousandeuro",
-                         hover_name="Partner",
-                         color_continuous_scale=px.colors.sequential.Plasma)
-    st.plotly_chart(dynamic_ireland_totals_map)
-    
-
-if ireland_totals_by_product_group is not None:
+    # Metrics are stored columns (see metrics.py), so switching only picks another column
+    selected_partner_metric = st.selectbox("Select Metric", list(views.PARTNER_MAP_METRICS))
+
+    # The year slider lives in the figure: every year is sent once as a z-only
+    # frame, so moving it costs no rerun and no new figure
+    with sections.timed("partner-map"), instrumentation.measure("partner-map", 'figure') as record:
+        dynamic_ireland_totals_map = snapshot_or_build('partner-map', (selected_partner_metric,), lambda: views.partner_map(
+            ireland_totals_by_partner, dataset_version('ireland_totals_by_partner'), selected_partner_metric))
+        record['bytes'] = len(dynamic_ireland_totals_map)
+        figures.plotly_chart_json(dynamic_ireland_totals_map)
+
+    if st.checkbox("Show totals over a range of years"):
+        partner_ranges = load_partner_ranges(ireland_totals_by_partner, dataset_version('ireland_totals_by_partner'))
+        partner_first_year, partner_last_year = int(partner_ranges['years'][0]), int(partner_ranges['years'][-1])
+        partner_year_range = st.slider("Select Years", min_value=partner_first_year, max_value=partner_last_year,
+                                       value=(partner_first_year, partner_last_year))
+
+        with sections.timed("partner-range-map"):
+            inputs = (partner_year_range, dataset_version('ireland_totals_by_partner'))
+            figures.plotly_chart_json(sections.memoized("partner-range-map", inputs, lambda: snapshot_or_build(
+                'partner-range-map', partner_year_range, lambda: views.partner_range_map(partner_ranges, *partner_year_range))))
+
+def product_group_section(data):
     st.header("Ireland's Export Quantity and Value Over the Years")
-    ireland_totals_by_product_group_years = ireland_totals_by_product_group['year'].unique()
-    ireland_totals_by_product_group_selected_year = st.slider('Select Year', min_value=int(ireland_totals_by_product_group_years.min()), max_value=int(ireland_totals_by_product_group_years.max()), value=int(ireland_totals_by_product_group_years.min()))
-    
-    ireland_totals_by_product_group_filtered_data = ireland_totals_by_product_group[ireland_totals_by_product_group['year'] == ireland_totals_by_product_group_selected_year]
-    
-    ireland_totals_by_product_group_fig = go.Figure()
-    
-    ireland_totals_by_product_group_fig.add_trace(
-        go.Bar(
-            x=ireland_totals_by_product_group_filtered_data['ProductGroup'],
-            y=ireland_totals_by_product_group_filtered_data['Quantityintonnes'],
-            name='Quantity in tonnes',
-            yaxis='y1',
-            marker=dict(color='rgba(54, 162, 235, 0.6)')
-        )
-    )
-
-    # Value per tonne on the right y-axis
-    ireland_totals_by_product_group_fig.add_trace(
-        go.Bar(
-            x=ireland_totals_by_product_group_filtered_data['ProductGroup'],
-            y=ireland_totals_by_product_group_filtered_data['Value_per_tonne'],
-            name='Value per tonne (Euro)',
-            yaxis='y2',
-            marker=dict(color='rgba(255, 99, 71, 0.6)')
-        )
-    )
-
-    # Update the layout for dual y-axes
-    ireland_totals_by_product_group_fig.update_layout(
-        title=f'Product Group Data for {ireland_totals_by_product_group_selected_year}',
-        xaxis_title='Product Group',
-        yaxis=dict(
-            title='Quantity in tonnes',
-            range=[0, 300000],
-            titlefont=dict(color='#1f77b4'),
-            tickfont=dict(color='#1f77b4')
-        ),
-        yaxis2=dict(
-            title='Value per tonne',
-            range=[0, 20],
-            titlefont=dict(color='#ff7f0e'),
-            tickfont=dict(color='#ff7f0e'),
-            overlaying='y',
-            side='right'
-        ),
-        legend=dict(x=0.1, y=1.1, orientation='h')
-    )
-
-    # Display the chart in Streamlit
-    st.plotly_chart(ireland_totals_by_product_group_fig)
+    product_group_ranges = load_product_group_ranges(data['ireland_totals_by_product_group'],
+                                                     dataset_version('ireland_totals_by_product_group'))
+    ireland_totals_by_product_group_years = product_group_ranges['years']
+    # Drag both ends apart for a multi-year total
+    ireland_totals_by_product_group_selected_years = st.slider('Select Years', min_value=int(ireland_totals_by_product_group_years.min()), max_value=int(ireland_totals_by_product_group_years.max()), value=(int(ireland_totals_by_product_group_years.min()), int(ireland_totals_by_product_group_years.min())))
+    first_year, last_year = ireland_totals_by_product_group_selected_years
+
+    with sections.timed("product-groups"):
+        inputs = (ireland_totals_by_product_group_selected_years,
+                  tuple(partition_version('ireland_totals_by_product_group', year) for year in range(first_year, last_year + 1)))
+        figures.plotly_chart_json(sections.memoized("product-groups", inputs, lambda: snapshot_or_build(
+            'product-groups', (first_year, last_year), lambda: views.product_group_chart(product_group_ranges, first_year, last_year))))
+
+# Any two reporters in any year they both cover, diffed on one partner-aligned matrix
+def comparison_section(data):
+    st.header("Dairy Trade Partners Comparison")
+    comparison_matrix = load_comparison_matrix([data[name] for name in comparison.REPORTER_DATASETS],
+                                               dataset_version(*comparison.REPORTER_DATASETS))
+    reporters = list(comparison_matrix['reporters'])
+    reporter_columns = st.columns(2)
+    reporter_a = reporter_columns[0].selectbox("Reporter", reporters, index=reporters.index('Ireland') if 'Ireland' in reporters else 0)
+    reporter_b = reporter_columns[1].selectbox("Compare with", reporters, index=len(reporters) - 1)
+    comparison_years = comparison.common_years(comparison_matrix, reporter_a, reporter_b)
+
+    if reporter_a == reporter_b:
+        st.info("Select two different reporters to compare.")
+    elif not comparison_years:
+        st.info(f"{reporter_a} and {reporter_b} have no year of partner data in common.")
+    else:
+        comparison_year = st.selectbox("Comparison Year", comparison_years[::-1])
 
-    
-# Example of a simple choropleth map for 2023 export partners
-if ireland_export_partners_2023 is not None and nl_totals_by_partners2023 is not None:
-    st.header("2023 Dairy Trade Partners Comparison (Ireland and Netherlands)")
-    fig4 = px.choropleth(ireland_export_partners_2023,
-                         locations="Alpha-3code_Partner",
-                         title="Ireland Export Partners by Value in thousand euro in 2023",
-                         color="Valueinthousandeuro",
-                         hover_name="Partner",
-                         color_continuous_scale=px.colors.sequential.Plasma)
-    st.plotly_chart(fig4)
-    
-    fig5 = px.choropleth(nl_totals_by_partners2023,
-                         locations="Alpha-3code_Partner",
-                         title="Netherlands Export Partners by Value in thousand euro in 2023",
-                         color="Valueinthousandeuro",
-                         hover_name="Partner",
-                         color_continuous_scale=px.colors.sequential.Plasma)
-    st.plotly_chart(fig5)
-    
-if milk_prices_df is not None:
+        with sections.timed("comparison"):
+            params = (reporter_a, reporter_b, comparison_year)
+            inputs = (*params, dataset_version(*comparison.REPORTER_DATASETS))
+            for spec in sections.memoized("comparison", inputs, lambda: snapshot_or_build(
+                    'comparison', params, lambda: views.comparison_maps(comparison_matrix, *params))):
+                figures.plotly_chart_json(spec)
+
+def milk_price_section(data):
     st.header("Organic and Raw Milk prices over the years")
     
-    milk_prices_unique_years = milk_prices_df['year'].unique()
-    milk_prices_selected_year = st.select_slider("Select Year", options=milk_prices_unique_years)
-    selected_milk_type = st.selectbox("Select Milk Type", ['Raw', 'Organic raw'])
-    
-    filtered_milk_prices_df = milk_prices_df[
-        (milk_prices_df['year'] == milk_prices_selected_year)
-    ]
+    selected_milk_type = st.selectbox("Select Milk Type", views.MILK_TYPES)
     
-    if (selected_milk_type == "Raw"):
-        color_column = "Raw milk price"
-    else:
-        color_column = "Organic raw milk price"
-        
-    dynamic_milk_prices_map = px.choropleth(filtered_milk_prices_df,
-                         locations="Country",
-                         locationmode="country names",
-                         title=f"{selected_milk_type} milk price (Euros per 100Kg) - {milk_prices_selected_year}",
-                         color=color_column,
-                         color_continuous_scale=px.colors.sequential.Plasma,
-                         scope="europe")
-    st.plotly_chart(dynamic_milk_prices_map)
+    with sections.timed("milk-prices"), instrumentation.measure("milk-prices", 'figure') as record:
+        dynamic_milk_prices_map = snapshot_or_build('milk-prices', (selected_milk_type,), lambda: views.milk_price_map(
+            data['milk_prices_df'], dataset_version('milk_prices_df'), selected_milk_type))
+        record['bytes'] = len(dynamic_milk_prices_map)
+        figures.plotly_chart_json(dynamic_milk_prices_map)
 
 # Handling forecast visualization with data checks
-if best_prediction_df is not None:
+def forecast_section(data):
+    best_prediction_df = data['best_prediction_df']
     st.header("Forecasted Quantity using Random Forest Regressor")
+    # Retraining runs in its own process; the new version is picked up on a later rerun.
+    # Only deployments that set DASH_ALLOW_RETRAIN=1 offer it to visitors
+    st.caption(f"Forecast version: {forecasting.current_version() or 'bundled CSV'}")
+    if forecasting.is_running():
+        st.caption("Retraining forecasts in the background...")
+    elif forecasting.RETRAIN_ENABLED and st.button("Retrain forecasts"):
+        forecasting.start_background()
+        st.caption("Retraining forecasts in the background...")
     unique_years = best_prediction_df['year'].unique()
-    unique_months = range(1, 13)
-    month_names = {month: calendar.month_name[month] for month in unique_months}
 
     selected_country = st.selectbox("Select Country", best_prediction_df['Partner'].unique())
-    selected_limit = st.selectbox("Select Limit", [5, 10, 20, -1], format_func=lambda x: "No limit" if x == -1 else f"Top {x} products")
-    selected_month = st.select_slider("Select Month", options=list(month_names.keys()), format_func=lambda x: month_names[x])
-
-    filtered_df = best_prediction_df[
-        (best_prediction_df['month'] == selected_month) &
-        (best_prediction_df['year'] == unique_years[0]) &
-        (best_prediction_df['Partner'] == selected_country)
-    ]
-
-    if selected_limit != -1:
-        filtered_df = filtered_df.nlargest(selected_limit, 'RF_ForecastedQuantity')
-
-    fig_forecast = px.bar(filtered_df, x='ProductGroup', y='RF_ForecastedQuantity', color='ProductGroup',
-                          title=f'Forecasted Export Quantity for {month_names[selected_month]} {unique_years[0]}')
-    st.plotly_chart(fig_forecast)
-    
+    selected_limit = st.selectbox("Select Limit", views.FORECAST_LIMITS, format_func=lambda x: "No limit" if x == -1 else f"Top {x} products")
+    selected_month = st.select_slider("Select Month", options=list(views.MONTH_NAMES), format_func=lambda x: views.MONTH_NAMES[x])
+
+    def build_forecast_chart():
+        forecast_index = load_forecast_index(best_prediction_df, dataset_version('best_prediction_df'))
+        return views.forecast_chart(forecast_index, selected_country, unique_years[0], selected_month, selected_limit)
+
+    with sections.timed("forecast"):
+        params = (selected_country, selected_limit, selected_month)
+        inputs = (*params, partition_version('best_prediction_df', unique_years[0], selected_month))
+        figures.plotly_chart_json(sections.memoized("forecast", inputs, lambda: snapshot_or_build(
+            'forecast', params, build_forecast_chart)))
+
+# Section -> (renderer, datasets it needs, message when one of them failed to load)
+SECTIONS = {
+    'trade': (trade_section, list(views.TRADE_DATASETS.values()), "Failed to load data. Please check the data URLs and format."),
+    'partner-map': (partner_map_section, ['ireland_totals_by_partner'], None),
+    'product-groups': (product_group_section, ['ireland_totals_by_product_group'], None),
+    'comparison': (comparison_section, comparison.REPORTER_DATASETS, None),
+    'milk-prices': (milk_price_section, ['milk_prices_df'], None),
+    'forecast': (forecast_section, ['best_prediction_df'], None),
+}
+
+instrumentation.start_run()
 
+# UI Elements
+selected_year = st.selectbox("Select Year", views.YEAR_OPTIONS)
+
+# Load Data: all datasets load concurrently. Every section gets its place on
+# the page up front and is filled in as soon as its own datasets arrive, so
+# a slow remote source only holds up the sections that read it
+pending = load_all(sorted({name for _, names, _ in SECTIONS.values() for name in names}))
+placeholders = {section: st.container() for section in SECTIONS}
+loaded = {}
+for name, dataset in as_loaded(pending):
+    loaded[name] = dataset
+    for section, (render, names, failure) in SECTIONS.items():
+        if name not in names or any(needed not in loaded for needed in names):
+            continue
+        with placeholders[section]:
+            if all(loaded[needed] is not None for needed in names):
+                render(loaded)
+            elif failure:
+                st.error(failure)
+
+sections.show_timings()
+instrumentation.show_summary()
@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+PARTNER_COLUMNS = ['Partner', 'Quantityintonnes']
+
+
+def partition(ordered, keys):
+    """Map each run of equal `keys` in an already sorted frame to its (start, stop) rows."""
+    if ordered.empty:
+        return {}
+    change = np.zeros(len(ordered), dtype=bool)
+    change[0] = True
+    for key in keys:
+        values = ordered[key].to_numpy()
+        change[1:] |= values[1:] != values[:-1]
+    starts = np.flatnonzero(change)
+    stops = np.append(starts[1:], len(ordered))
+    labels = ordered[keys].iloc[starts].itertuples(index=False, name=None)
+    return dict(zip(labels, zip(starts.tolist(), stops.tolist())))
+
+
+def lookup(partitioned, key, limit=None, frame='rows'):
+    """Rows of one partition of `partitioned[frame]`, optionally only the first `limit` of them."""
+    start, stop = partitioned['offsets'].get(key, (0, 0))
+    if limit is not None:
+        stop = min(stop, start + limit)
+    return partitioned[frame].iloc[start:stop]
+
+
+def partner_totals(datasets):
+    return pd.concat(
+        [data.groupby(['ProductGroup', 'year', 'Partner'], observed=True)['Quantityintonnes'].sum()
+             .reset_index().assign(dataset=label)
+         for label, data in datasets.items()],
+        ignore_index=True)
+
+
+def index_partner_totals(totals):
+    totals = totals.sort_values(by=['dataset', 'ProductGroup', 'year', 'Quantityintonnes'],
+                                ascending=[True, True, True, False], kind='stable', ignore_index=True)
+    # 'rows' keeps every column for update_partner_cube(); 'partners' is what
+    # the charts read, so a lookup is a plain slice without a column copy
+    return {'rows': totals, 'partners': totals[PARTNER_COLUMNS],
+            'offsets': partition(totals, ['dataset', 'ProductGroup', 'year'])}
+
+
+def build_partner_cube(datasets):
+    """Partner totals keyed by (dataset, ProductGroup, year), sorted largest first.
+
+    `datasets` maps a dataset label (e.g. 'Imports') to its trade frame. All
+    totals live in one sorted frame; the cube only stores row offsets into it.
+    """
+    return index_partner_totals(partner_totals(datasets))
+
+
+def update_partner_cube(cube, datasets, years):
+    """Re-aggregate only `years` of `datasets` and splice them into an existing cube.
+
+    Totals of every other year are reused, so appending a month of trade
+    data costs one groupby over that year instead of over the whole history.
+    """
+    fresh = partner_totals({label: data[data['year'].isin(years)] for label, data in datasets.items()})
+    kept = cube['rows'][~cube['rows']['year'].isin(years)]
+    totals = pd.concat([kept, fresh], ignore_index=True)
+    # Concatenating categoricals with different categories falls back to object
+    return index_partner_totals(totals.astype({'ProductGroup': 'category', 'Partner': 'category'}))
+
+
+def top_partners(cube, label, product_group, year, limit=None):
+    return lookup(cube, (label, product_group, year), limit, frame='partners')
+
+
+def build_forecast_index(data):
+    """Forecast rows partitioned by (Partner, year, month), largest forecast first."""
+    ordered = data.sort_values(by=['Partner', 'year', 'month', 'RF_ForecastedQuantity'],
+                               ascending=[True, True, True, False], kind='stable', ignore_index=True)
+    return {'rows': ordered, 'offsets': partition(ordered, ['Partner', 'year', 'month'])}
+
+
+def top_forecasts(index, partner, year, month, limit=None):
+    return lookup(index, (partner, year, month), limit)
+
+
+def build_range_index(data, keys, measures):
+    """Per-key running totals of `measures` over the years, for year-range totals in two lookups.
+
+    `cumulative[measure][k, i]` is key row k's total over the years before
+    `years[i]`; the last column is its total over all years.
+    """
+    totals = data.groupby([*keys, 'year'], observed=True, dropna=False)[measures].sum()
+    key_index = totals.index.droplevel('year').unique()
+    years = np.sort(totals.index.get_level_values('year').unique().to_numpy())
+    rows = key_index.get_indexer(totals.index.droplevel('year'))
+    columns = np.searchsorted(years, totals.index.get_level_values('year')) + 1
+    cumulative = {}
+    for measure in measures:
+        dense = np.zeros((len(key_index), len(years) + 1))
+        dense[rows, columns] = totals[measure].to_numpy()
+        cumulative[measure] = np.cumsum(dense, axis=1)
+    return {'keys': key_index.to_frame(index=False), 'years': years, 'cumulative': cumulative}
+
+
+def range_totals(index, start, end):
+    """Totals of every key over the years `start`..`end` inclusive."""
+    first = np.searchsorted(index['years'], start, side='left')
+    last = np.searchsorted(index['years'], end, side='right')
+    return index['keys'].assign(**{measure: cumulative[:, last] - cumulative[:, first]
+                                   for measure, cumulative in index['cumulative'].items()})
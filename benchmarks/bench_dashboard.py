@@ -0,0 +1,186 @@
+"""Benchmarks for the dashboard's data and figure paths, with a stored baseline.
+
+Times the pure data functions on the bundled CSVs and on synthetic copies
+scaled 10x and 100x, records peak traced memory, and runs
+Dairy_tarde_dash.py headlessly. Run from the repository root:
+
+    python benchmarks/bench_dashboard.py                    # compare with baseline.json
+    python benchmarks/bench_dashboard.py --update-baseline  # record a new baseline
+
+Exits non-zero when a case is slower (or uses more memory) than its
+baseline by more than --tolerance; timing differences under --min-ms
+(1 ms) are treated as noise.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import pyarrow.feather as feather
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import aggregates  # noqa: E402
+import figures  # noqa: E402
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+SCALES = [1, 10, 100]
+
+
+def scale_history(data, factor):
+    """Repeat `data` `factor` times, shifting each copy further back in time."""
+    if factor == 1:
+        return data
+    span = int(data['year'].max() - data['year'].min() + 1)
+    copies = [data.assign(year=data['year'] - span * k) for k in range(factor)]
+    return pd.concat(copies, ignore_index=True)
+
+
+def trade_frame(factor, seed=0):
+    """Imports/exports-shaped frame built from the bundled partners and product groups."""
+    partners = pd.read_csv(ROOT / "ireland_totals_by_partner_steamlit.csv")[['year', 'Partner']]
+    product_groups = pd.read_csv(ROOT / "ireland_totals_by_product_group_steamlit.csv")['ProductGroup'].unique()
+    rng = np.random.default_rng(seed)
+    trade = partners.loc[partners.index.repeat(len(product_groups))].reset_index(drop=True)
+    trade['ProductGroup'] = np.tile(product_groups, len(partners))
+    trade['Quantityintonnes'] = rng.random(len(trade)) * 1000
+    return scale_history(trade, factor)
+
+
+def legacy_plot_filter(data, product_group, year, limit):
+    filtered_data = data[(data['ProductGroup'] == product_group) & (data['year'] == year)]
+    summary = filtered_data.groupby('Partner')['Quantityintonnes'].sum().reset_index()
+    return summary.sort_values(by='Quantityintonnes', ascending=False).head(limit)
+
+
+def legacy_forecast_filter(data, partner, year, month, limit):
+    filtered_df = data[(data['month'] == month) & (data['year'] == year) & (data['Partner'] == partner)]
+    return filtered_df.nlargest(limit, 'RF_ForecastedQuantity')
+
+
+def choropleth_json(data, year):
+    figure = px.choropleth(data[data['year'] == year], locations="Alpha-3code_Partner",
+                           color="Valueinthousandeuro", hover_name="Partner",
+                           color_continuous_scale=px.colors.sequential.Plasma)
+    return figures.figure_to_json(figure)
+
+
+def data_cases(factor, workdir):
+    """Yield (case name, callable) pairs for one scale factor."""
+    forecasts = scale_history(pd.read_csv(ROOT / "best_prediction_df_steamlit.csv"), factor)
+    csv_path = workdir / f"best_prediction_{factor}x.csv"
+    arrow_path = workdir / f"best_prediction_{factor}x.arrow"
+    forecasts.to_csv(csv_path, index=False)
+    feather.write_feather(forecasts, arrow_path, compression='uncompressed')
+
+    trade = trade_frame(factor)
+    product_group, year = trade['ProductGroup'].iloc[0], int(trade['year'].max())
+    cube = aggregates.build_partner_cube({'Imports': trade})
+    partner, forecast_year = forecasts['Partner'].iloc[0], int(forecasts['year'].max())
+    index = aggregates.build_forecast_index(forecasts)
+    partners = scale_history(pd.read_csv(ROOT / "ireland_totals_by_partner_steamlit.csv"), factor)
+
+    yield "load_data.read_csv", lambda: pd.read_csv(csv_path)
+    yield "load_data.arrow_mmap", lambda: feather.read_table(arrow_path, memory_map=True).to_pandas(split_blocks=True)
+    yield "plot_data.mask_groupby", lambda: legacy_plot_filter(trade, product_group, year, 10)
+    yield "plot_data.cube_build", lambda: aggregates.build_partner_cube({'Imports': trade})
+    yield "plot_data.cube_lookup", lambda: aggregates.top_partners(cube, 'Imports', product_group, year, 10)
+    yield "forecast.nlargest", lambda: legacy_forecast_filter(forecasts, partner, forecast_year, 1, 10)
+    yield "forecast.index_lookup", lambda: aggregates.top_forecasts(index, partner, forecast_year, 1, 10)
+    yield "choropleth.build_json", lambda: choropleth_json(partners, int(partners['year'].max()))
+
+
+def run_headless_app():
+    """Run the whole dashboard script once without a browser."""
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        # Streamlit < 1.28 has no AppTest; bare-mode execution still runs every section
+        result = subprocess.run([sys.executable, str(ROOT / "Dairy_tarde_dash.py")], cwd=ROOT,
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr[-2000:])
+        return
+    app = AppTest.from_file(str(ROOT / "Dairy_tarde_dash.py"), default_timeout=120)
+    app.run()
+    if app.exception:
+        raise RuntimeError(app.exception)
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'ms': round(min(timings), 3), 'peak_kib': round(peak / 1024, 1)}
+
+
+def run_all(repeat, scales):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for factor in scales:
+            for name, func in data_cases(factor, Path(tmp)):
+                case = f"{name}@{factor}x"
+                results[case] = measure(func, repeat)
+                print(f"{case:<32} {results[case]['ms']:>10.2f} ms {results[case]['peak_kib']:>12.1f} KiB")
+    start = time.perf_counter()
+    run_headless_app()
+    results['app.headless_run'] = {'ms': round((time.perf_counter() - start) * 1000, 3)}
+    print(f"{'app.headless_run':<32} {results['app.headless_run']['ms']:>10.2f} ms")
+    return results
+
+
+def compare(results, baseline, tolerance, min_ms):
+    regressions = []
+    floors = {'ms': min_ms, 'peak_kib': 0}
+    for case, current in results.items():
+        expected = baseline.get(case)
+        if expected is None:
+            continue
+        for metric, floor in floors.items():
+            if (metric in current and metric in expected and current[metric] > expected[metric] * (1 + tolerance)
+                    and current[metric] - expected[metric] > floor):
+                regressions.append(f"{case} {metric}: {current[metric]} vs baseline {expected[metric]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dashboard data and figure benchmarks.")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--scales', type=int, nargs='+', default=SCALES)
+    parser.add_argument('--tolerance', type=float, default=float(os.environ.get('BENCH_TOLERANCE', 1.0)),
+                        help="allowed relative slowdown before failing (1.0 = twice the baseline)")
+    parser.add_argument('--min-ms', type=float, default=float(os.environ.get('BENCH_MIN_MS', 1.0)),
+                        help="slowdowns smaller than this many milliseconds never fail")
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    results = run_all(args.repeat, args.scales)
+    if args.update_baseline or not BASELINE_PATH.exists():
+        BASELINE_PATH.write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
+        print(f"baseline written to {BASELINE_PATH}")
+        return
+
+    regressions = compare(results, json.loads(BASELINE_PATH.read_text()), args.tolerance, args.min_ms)
+    if regressions:
+        print("\nREGRESSIONS:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+    print("\nno regressions against baseline")
+
+
+if __name__ == '__main__':
+    main()
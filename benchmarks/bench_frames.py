@@ -0,0 +1,109 @@
+"""Microbenchmark: per-year filtering loops vs the single-pass frame builders.
+
+Run from the repository root:
+
+    python benchmarks/bench_frames.py [--years 50] [--countries 200]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import figures  # noqa: E402
+
+
+def synthetic_partners(years, countries, seed=0):
+    rng = np.random.default_rng(seed)
+    codes = [f"C{i:03d}" for i in range(countries)]
+    data = pd.DataFrame({
+        'year': np.repeat(np.arange(2024 - years, 2024), countries),
+        'Partner': np.tile([f"Country {i}" for i in range(countries)], years),
+        'Alpha-3code_Partner': np.tile(codes, years),
+        'Quantityintonnes': rng.random(years * countries) * 1e5,
+        'Valueinthousandeuro': rng.random(years * countries) * 3e5,
+    })
+    return data.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+def loop_split(data):
+    return {year: data[data['year'] == year] for year in data['year'].unique()}
+
+
+def loop_frames(data):
+    frames = []
+    for year in data['year'].unique():
+        df_year = data[data['year'] == year]
+        frames.append(go.Frame(data=[go.Bar(x=df_year['Partner'], y=df_year['Quantityintonnes'])], name=str(year)))
+    return frames
+
+
+def split_frames(data):
+    return [go.Frame(data=[go.Bar(x=df_year['Partner'], y=df_year['Quantityintonnes'])], name=str(year))
+            for year, df_year in figures.split_frames(data, 'year').items()]
+
+
+def nested_fig3(data):
+    fig_quantity = px.choropleth(data, locations="Alpha-3code_Partner", color="Quantityintonnes",
+                                 hover_name="Partner", animation_frame="year", animation_group="Partner")
+    fig_value = px.choropleth(data, locations="Alpha-3code_Partner", color="Valueinthousandeuro",
+                              hover_name="Partner", animation_frame="year", animation_group="Partner")
+    fig3 = go.Figure()
+    for trace in fig_quantity.data + fig_value.data:
+        fig3.add_trace(trace)
+    frames = []
+    for year in data['year'].unique():
+        frame_data = []
+        for frame in fig_quantity.frames:
+            if frame.name == str(year):
+                frame_data.extend(frame.data)
+        for frame in fig_value.frames:
+            if frame.name == str(year):
+                frame_data.extend(frame.data)
+        frames.append(go.Frame(data=frame_data, name=str(year)))
+    fig3.frames = frames
+    return fig3
+
+
+def packed_fig3(data):
+    return figures.animated_choropleth(data, 'year', 'Alpha-3code_Partner',
+                                       ['Quantityintonnes', 'Valueinthousandeuro'], ['Quantity', 'Value'],
+                                       hover_column='Partner')
+
+
+def best_of(func, data, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(data)
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--years', type=int, default=50)
+    parser.add_argument('--countries', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    data = synthetic_partners(args.years, args.countries)
+    print(f"{len(data)} rows ({args.years} years x {args.countries} countries), best of {args.repeat}")
+    for label, baseline, candidate in [
+        ("yearly split", loop_split, lambda data: figures.split_frames(data, 'year')),
+        ("yearly frames", loop_frames, split_frames),
+        ("fig3 assembly", nested_fig3, packed_fig3),
+    ]:
+        before = best_of(baseline, data, args.repeat)
+        after = best_of(candidate, data, args.repeat)
+        print(f"{label:<15} loop {before:9.1f} ms   single-pass {after:9.1f} ms   {before / after:5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
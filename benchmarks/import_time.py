@@ -0,0 +1,73 @@
+"""Import-time report for the dashboard scripts, in the style of `python -X importtime`.
+
+Runs only the top-level import statements of each script (what a fresh
+worker pays before the first widget is drawn) under -X importtime, and
+lists the heaviest top-level packages. Run from the repository root:
+
+    python benchmarks/import_time.py                      # Dairy_tarde_dash.py and untitled.py
+    python benchmarks/import_time.py untitled1.py --top 20
+    python benchmarks/import_time.py --module forecasting  # a module instead of a script
+"""
+import argparse
+import ast
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+SCRIPTS = ["Dairy_tarde_dash.py", "untitled.py"]
+
+
+def import_statements(script):
+    """Source of the import statements at the top level of `script`."""
+    source = (ROOT / script).read_text()
+    tree = ast.parse(source)
+    return "\n".join(ast.get_source_segment(source, node) for node in tree.body
+                     if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def importtime(code):
+    """[(name, depth, self_us, cumulative_us)] for every module imported by `code`, in import order."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return rows
+
+
+def report(label, code, top):
+    rows = importtime(code)
+    top_level = sorted((row for row in rows if row[1] == 0), key=lambda row: row[3], reverse=True)
+    total = sum(row[3] for row in top_level)
+    print(f"{label}: {len(rows)} modules, {total / 1000:.0f} ms")
+    for name, _, _, cumulative_us in top_level[:top]:
+        print(f"  {cumulative_us / 1000:>9.1f} ms  {name}")
+    # Streamlit itself pulls in plotly.io; plotly.express is the expensive part
+    loaded = {row[0] for row in rows}
+    for package in ("plotly.express", "sklearn", "scipy"):
+        print(f"  {package:<15} {'imported' if package in loaded else 'deferred'}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report what each dashboard script imports at start-up.")
+    parser.add_argument('scripts', nargs='*', help=f"scripts to report (default: {' '.join(SCRIPTS)})")
+    parser.add_argument('--module', action='append', default=[], help="report `import MODULE` instead")
+    parser.add_argument('--top', type=int, default=10, help="top-level packages to list")
+    args = parser.parse_args()
+
+    for module in args.module:
+        report(module, f"import {module}", args.top)
+    for script in args.scripts or ([] if args.module else SCRIPTS):
+        report(script, import_statements(script), args.top)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Reporter x partner x year comparisons of dairy trade.
+
+The partner totals of every reporting country are stacked into one long
+table and pivoted once into a dense array per measure, indexed
+[reporter, year, partner] over a partner axis shared by all reporters.
+Comparing two reporters in a year is then two row slices and a subtraction,
+with no per-comparison export or groupby.
+"""
+import numpy as np
+import pandas as pd
+
+# Datasets holding one reporter's (the `Country` column) totals per partner and year
+REPORTER_DATASETS = ['ireland_totals_by_partner', 'nl_totals_by_partners2023']
+MEASURES = ['Quantityintonnes', 'Valueinthousandeuro']
+
+
+def long_table(frames):
+    """(Country, year, Partner, Alpha-3code_Partner, measures...) rows of every reporter dataset."""
+    columns = ['Country', 'year', 'Partner', 'Alpha-3code_Partner', *MEASURES]
+    long = pd.concat([data[columns] for data in frames], ignore_index=True)
+    # Concatenating categoricals with different categories falls back to object
+    return long.astype({'Country': 'category', 'Partner': 'category', 'Alpha-3code_Partner': 'category'})
+
+
+def build_matrix(long):
+    """Dense [reporter, year, partner] arrays of each measure; NaN where a reporter has no row."""
+    totals = long.groupby(['Country', 'year', 'Partner'], observed=True)[MEASURES].sum().reset_index()
+    reporters = pd.Index(sorted(totals['Country'].astype(str).unique()))
+    years = pd.Index(sorted(totals['year'].unique()))
+    partners = pd.Index(sorted(totals['Partner'].astype(str).unique()))
+    r = reporters.get_indexer(totals['Country'].astype(str))
+    y = years.get_indexer(totals['year'])
+    p = partners.get_indexer(totals['Partner'].astype(str))
+
+    values = {}
+    for measure in MEASURES:
+        values[measure] = np.full((len(reporters), len(years), len(partners)), np.nan)
+        values[measure][r, y, p] = totals[measure].to_numpy()
+    reported = np.zeros((len(reporters), len(years)), dtype=bool)
+    reported[r, y] = True
+    codes = long.groupby('Partner', observed=True)['Alpha-3code_Partner'].first().astype(object)
+    return {
+        'reporters': reporters,
+        'years': years,
+        'partners': partners,
+        'codes': codes.reindex(partners).to_numpy(),
+        'values': values,
+        'reported': reported,
+    }
+
+
+def common_years(matrix, a, b):
+    """Years for which both reporters have partner data, oldest first."""
+    both = matrix['reported'][matrix['reporters'].get_loc(a)] & matrix['reported'][matrix['reporters'].get_loc(b)]
+    return matrix['years'][both].tolist()
+
+
+def compare(matrix, a, b, year, measure='Valueinthousandeuro'):
+    """Partner-aligned `measure` of reporters `a` and `b` in `year`, and their difference.
+
+    Partners that neither reporter traded with are left out. A partner only
+    one of them traded with is NaN for the other and counts as 0 in the
+    difference.
+    """
+    y = matrix['years'].get_loc(year)
+    values = matrix['values'][measure]
+    left = values[matrix['reporters'].get_loc(a), y]
+    right = values[matrix['reporters'].get_loc(b), y]
+    traded = ~(np.isnan(left) & np.isnan(right))
+    left, right = left[traded], right[traded]
+    return pd.DataFrame({
+        'Partner': matrix['partners'][traded],
+        'Alpha-3code_Partner': matrix['codes'][traded],
+        a: left,
+        b: right,
+        'Difference': np.nan_to_num(left) - np.nan_to_num(right),
+    })
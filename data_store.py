@@ -0,0 +1,431 @@
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+import geo
+import metrics
+import remote
+
+BASE_DIR = Path(__file__).resolve().parent
+# Point DATA_STORE_DIR at shared memory (e.g. /dev/shm/dairy-store) to let
+# several app processes map the same Arrow files. With DATA_STORE_ATTACH=1 an
+# app process never ingests; a separate `python data_store.py --watch` keeps
+# the store current and workers only attach to it.
+STORE_DIR = Path(os.environ.get('DATA_STORE_DIR', BASE_DIR / ".store"))
+ATTACH_ONLY = os.environ.get('DATA_STORE_ATTACH', '') not in ('', '0')
+REMOTE_URL = os.environ.get('DATA_REMOTE_URL', "https://raw.githubusercontent.com/sbs24011/Streamlit/main/").rstrip('/') + "/{}"
+
+# Repeated string columns kept as categoricals (dictionary-encoded on disk)
+CATEGORICAL_COLUMNS = ['Partner', 'ProductGroup', 'Country', 'partner_code', 'Alpha-3code_Partner',
+                       'Alpha-3code_Country']
+
+# Name column -> ISO-3 column filled in at ingest, so maps never match names at render time
+ISO3_COLUMNS = {
+    'Partner': 'Alpha-3code_Partner',
+    'Country': 'Alpha-3code_Country',
+}
+
+# Compact dtypes applied at ingest. Quantities and values stay float64 because
+# they are summed across partners; float32 is only used for display-only
+# columns. Columns not listed keep pandas' defaults (CATEGORICAL_COLUMNS still
+# become categories).
+TRADE_SCHEMA = {
+    'year': 'int16',
+    'Quantityintonnes': 'float64',
+    'Valueinthousandeuro': 'float64',
+    **{column: 'float32' for column in metrics.DERIVED_COLUMNS},
+}
+SCHEMAS = {
+    'imports_data': TRADE_SCHEMA,
+    'exports_data': TRADE_SCHEMA,
+    'ireland_totals_by_partner': TRADE_SCHEMA,
+    'ireland_export_partners_2023': TRADE_SCHEMA,
+    'nl_totals_by_partners2023': TRADE_SCHEMA,
+    'best_prediction_df': {
+        'MonthDate': 'datetime64[ns]',
+        'year': 'int16',
+        'month': 'int8',
+        'RF_ForecastedQuantity': 'float32',
+    },
+    'milk_prices_df': {
+        'year': 'int16',
+    },
+    'ireland_totals_by_product_group': {
+        'year': 'int16',
+        **{column: 'float32' for column in metrics.DERIVED_COLUMNS},
+    },
+    'principal_components': {
+        'PC1': 'float32',
+        'PC2': 'float32',
+        'Cluster': 'int8',
+    },
+}
+
+# Dataset name -> source CSV, bundled next to this file or fetched from REMOTE_URL
+DATASETS = {
+    'imports_data': 'ireland_imports.csv',
+    'exports_data': 'ireland_exports.csv',
+    'ireland_totals_by_partner': 'ireland_totals_by_partner_steamlit.csv',
+    'ireland_export_partners_2023': 'ireland_export_partners_2023_steamlit.csv',
+    'nl_totals_by_partners2023': 'nl_totals_by_partners2023_steamlit.csv',
+    'best_prediction_df': 'best_prediction_df_steamlit.csv',
+    'milk_prices_df': 'milk_prices_df_steamlit.csv',
+    'ireland_totals_by_product_group': 'ireland_totals_by_product_group_steamlit.csv',
+    'principal_components': 'principal_components_steamlit.csv',
+    'challenge_other': 'challenge_other_steamlit.csv',
+}
+
+# Columns that split a dataset into independently replaceable partitions.
+# New monthly data is appended per partition (see append()); datasets not
+# listed here can only be re-ingested whole.
+PARTITION_COLUMNS = {
+    'imports_data': ['year'],
+    'exports_data': ['year'],
+    'ireland_totals_by_partner': ['year'],
+    'best_prediction_df': ['year', 'month'],
+    'milk_prices_df': ['year'],
+    'ireland_totals_by_product_group': ['year'],
+}
+
+
+def source_path(name):
+    return BASE_DIR / DATASETS[name]
+
+
+def remote_copy_path(name):
+    """Last downloaded copy of a source that is not bundled."""
+    return STORE_DIR / "remote" / DATASETS[name]
+
+
+def local_source(name):
+    path = source_path(name)
+    return path if path.exists() else remote_copy_path(name)
+
+
+def store_path(name):
+    return STORE_DIR / f"{name}.arrow"
+
+
+def meta_path(name):
+    return STORE_DIR / f"{name}.json"
+
+
+def appends_dir(name):
+    """Partitions added with append(), replayed on top of the source CSV at every full ingest."""
+    return STORE_DIR / "appends" / name
+
+
+def appends_signature(name):
+    return [[path.name, path.stat().st_size, path.stat().st_mtime_ns]
+            for path in sorted(appends_dir(name).glob('*.csv'))]
+
+
+def source_signature(name):
+    """Size and mtime of the bundled CSV (or downloaded copy), None if neither exists."""
+    path = local_source(name)
+    if not path.exists():
+        return None
+    stat = path.stat()
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def store_signature(name):
+    """Signature that changes whenever the stored copy of `name` is replaced."""
+    if not ATTACH_ONLY:
+        signature = source_signature(name)
+        return signature and {**signature, 'appends': appends_signature(name)}
+    try:
+        stat = store_path(name).stat()
+    except OSError:
+        return None
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'inode': stat.st_ino}
+
+
+def read_meta(name):
+    try:
+        return json.loads(meta_path(name).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def is_stale(name):
+    meta = read_meta(name)
+    if meta is None or 'digest' not in meta or not store_path(name).exists():
+        return True
+    return (meta.get('source') != source_signature(name) or meta.get('schema') != schema(name)
+            or meta.get('appends', []) != appends_signature(name))
+
+
+def refresh_remote(name, timeout=None):
+    """Revalidate the downloaded copy of a non-bundled source.
+
+    Returns True if new content arrived. When the server cannot be reached
+    the last good copy is kept and used.
+    """
+    if source_path(name).exists():
+        return False
+    try:
+        return remote.fetch(REMOTE_URL.format(DATASETS[name]), remote_copy_path(name), timeout)
+    except OSError:
+        if remote_copy_path(name).exists():
+            return False
+        raise
+
+
+def schema(name):
+    return {**{column: 'category' for column in CATEGORICAL_COLUMNS}, **SCHEMAS.get(name, {})}
+
+
+def apply_schema(data, dtypes):
+    return data.astype({column: dtype for column, dtype in dtypes.items() if column in data.columns})
+
+
+def normalize_countries(data, name):
+    """Add the ISO-3 code of every country/partner name, warning about names without one."""
+    for column, code_column in ISO3_COLUMNS.items():
+        if column not in data.columns:
+            continue
+        codes, unmatched = geo.to_iso3(data[column])
+        if code_column in data.columns:
+            # Names missing from country_codes.csv keep the code the source shipped with
+            codes = codes.astype(object).fillna(data[code_column].astype(object))
+        data = data.assign(**{code_column: codes})
+        if unmatched:
+            warnings.warn(f"{name}: no ISO-3 code for {column} {', '.join(unmatched)}; add them to {geo.CODES_PATH.name}")
+    return data
+
+
+def prepare(data, name):
+    return apply_schema(normalize_countries(data, name), schema(name))
+
+
+def read_source(name):
+    data = prepare(pd.read_csv(local_source(name)), name)
+    for path in sorted(appends_dir(name).glob('*.csv')):
+        # Appended rows were written with exact float reprs; parse them back
+        # bit for bit so a re-ingest reproduces the digests append() recorded
+        appended = pd.read_csv(path, float_precision='round_trip')
+        data = replace_partitions(data, prepare(appended, name), name)
+    return metrics.derive(data, name)
+
+
+def partition_key(values):
+    """'2024' or '2024-3' for a tuple of partition column values."""
+    values = values if isinstance(values, tuple) else (values,)
+    return '-'.join(str(int(value)) for value in values)
+
+
+def content_digest(data):
+    """Hash of the rows of `data`, independent of where and when it was written."""
+    return format(int(pd.util.hash_pandas_object(data, index=False).sum()), 'x')
+
+
+def partitions_digest(partitions):
+    """Digest of a whole dataset from its partition digests, without rehashing any row."""
+    return hashlib.sha1(json.dumps(sorted(partitions.items())).encode()).hexdigest()[:16]
+
+
+def partition_digests(data, name):
+    """Content hash of every partition of `data`, keyed by partition_key()."""
+    columns = PARTITION_COLUMNS.get(name)
+    if not columns or data.empty:
+        return {}
+    return {partition_key(values): content_digest(part)
+            for values, part in data.groupby(columns, observed=True, sort=False)}
+
+
+def replace_partitions(data, new_data, name):
+    """`data` with every partition present in `new_data` replaced by the new rows."""
+    columns = PARTITION_COLUMNS[name]
+    replaced = pd.MultiIndex.from_frame(data[columns]).isin(pd.MultiIndex.from_frame(new_data[columns]))
+    combined = pd.concat([data[~replaced], new_data], ignore_index=True)
+    combined = combined.sort_values(columns, kind='stable', ignore_index=True)
+    # Re-apply the schema so categoricals take the union of old and new categories
+    return apply_schema(combined, schema(name))
+
+
+def memory_report(frames):
+    """Rows and deep in-memory bytes of each frame in {name: frame}."""
+    return pd.DataFrame({
+        name: {'rows': len(data), 'bytes': int(data.memory_usage(deep=True).sum()), 'mapped_bytes': mapped_bytes(data)}
+        for name, data in frames.items()
+    }).T
+
+
+def mapped_bytes(data):
+    """Bytes of column data backed by foreign buffers (e.g. the memory-mapped store) rather than the heap."""
+    total = 0
+    for column in data.columns:
+        series = data[column]
+        values = series.array.codes if isinstance(series.dtype, pd.CategoricalDtype) else series.to_numpy()
+        root = values
+        while isinstance(root, np.ndarray) and root.base is not None:
+            root = root.base
+        if not isinstance(root, np.ndarray):
+            total += values.nbytes
+    return total
+
+
+def replace_file(path, write):
+    """Call `write` on a temp file of its own in STORE_DIR, then move it over `path`.
+
+    Processes ingesting the same dataset never share a temp file, and
+    readers only ever see a complete file.
+    """
+    with tempfile.NamedTemporaryFile(dir=STORE_DIR, prefix=f".{path.name}.", suffix='.tmp', delete=False) as tmp:
+        tmp_path = Path(tmp.name)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def write_store(name, data, partitions):
+    STORE_DIR.mkdir(parents=True, exist_ok=True)
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    # Uncompressed Arrow IPC so the file can be memory-mapped without decoding
+    replace_file(store_path(name), lambda path: feather.write_feather(table, path, compression='uncompressed'))
+    meta = json.dumps({
+        'source': source_signature(name),
+        'schema': schema(name),
+        'appends': appends_signature(name),
+        'rows': len(data),
+        # Partitioned datasets are digested from their partitions, so an append
+        # only hashes the partitions it touched
+        'digest': partitions_digest(partitions) if partitions else content_digest(data),
+        'partitions': partitions,
+    })
+    replace_file(meta_path(name), lambda path: path.write_text(meta))
+
+
+def ingest(name):
+    """Parse the source CSV once and write it to the columnar store."""
+    data = read_source(name)
+    write_store(name, data, partition_digests(data, name))
+    return data
+
+
+def append(name, new_data):
+    """Add or replace whole partitions of `name` without re-parsing its history.
+
+    `new_data` holds complete partitions (e.g. one new month of forecasts).
+    The stored rows are reused as they are; derived metrics are recomputed
+    and partitions rehashed only for the appended years and the years after
+    them (whose year-over-year figures depend on them). Returns the keys of
+    the partitions whose content changed, which includes those neighbours.
+    """
+    if name not in PARTITION_COLUMNS:
+        raise ValueError(f"{name} is not partitioned; re-ingest it instead")
+    new_data = prepare(new_data, name)
+    if is_stale(name):
+        ingest(name)
+    meta = read_meta(name)
+    columns = PARTITION_COLUMNS[name]
+    data = replace_partitions(attach(name), new_data, name)
+    years = new_data['year'].unique()
+    data = metrics.derive(data, name, years)
+    touched = pd.MultiIndex.from_frame(data[columns]).isin(pd.MultiIndex.from_frame(new_data[columns]))
+    if name in metrics.DERIVED:
+        touched |= data['year'].isin(metrics.affected_years(years)).to_numpy()
+    digests = {**meta['partitions'], **partition_digests(data[touched], name)}
+    changed = sorted(key for key, digest in digests.items() if meta['partitions'].get(key) != digest)
+    if not changed:
+        return []
+
+    # Keep the raw rows so a later full ingest (e.g. after the CSV itself
+    # changed) replays them on top of the new source
+    appends_dir(name).mkdir(parents=True, exist_ok=True)
+    for values, part in new_data.groupby(columns, observed=True, sort=False):
+        part.to_csv(appends_dir(name) / f"{partition_key(values)}.csv", index=False)
+
+    write_store(name, data, digests)
+    return changed
+
+
+def attach(name):
+    """Zero-copy view of the stored dataset; its columns are read-only."""
+    table = feather.read_table(store_path(name), memory_map=True)
+    return table.to_pandas(split_blocks=True)
+
+
+def load(name, timeout=None):
+    """Memory-map a dataset from the store, re-ingesting it when missing or stale.
+
+    Non-bundled sources are revalidated first; a 304 keeps the stored copy.
+    `timeout` (seconds) applies to that request. In attach-only mode the
+    store is used as is and only ingested if the loader has not created it.
+    """
+    if ATTACH_ONLY and store_path(name).exists():
+        return attach(name)
+    refresh_remote(name, timeout)
+    if is_stale(name):
+        ingest(name)
+    return attach(name)
+
+
+def refresh_all(names):
+    """Bring every dataset in `names` up to date; returns the ones re-ingested."""
+    updated = []
+    for name in names:
+        try:
+            refresh_remote(name)
+            if is_stale(name):
+                ingest(name)
+                updated.append(name)
+        except Exception as e:
+            print(f"{name}: failed to ingest ({e})")
+    return updated
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Ingest the CSV sources into the columnar store.")
+    parser.add_argument('names', nargs='*', help="datasets to ingest (default: all)")
+    parser.add_argument('--report', action='store_true', help="compare memory with default CSV dtypes")
+    parser.add_argument('--watch', type=float, metavar='SECONDS',
+                        help="keep running as the loader process, re-ingesting changed sources")
+    parser.add_argument('--append', metavar='CSV',
+                        help="add the year/month partitions in CSV to the single dataset named")
+    args = parser.parse_args()
+
+    if args.append:
+        if len(args.names) != 1:
+            parser.error("--append takes exactly one dataset name")
+        changed = append(args.names[0], pd.read_csv(args.append))
+        print(f"{args.names[0]}: {', '.join(changed) or 'no'} partitions changed")
+        raise SystemExit
+
+    if args.watch:
+        print(f"serving {STORE_DIR}, checking sources every {args.watch:g}s")
+        while True:
+            for name in refresh_all(args.names or list(DATASETS)):
+                print(f"{name}: re-ingested")
+            time.sleep(args.watch)
+
+    loaded = {}
+    for name in args.names or list(DATASETS):
+        try:
+            refresh_remote(name)
+            loaded[name] = ingest(name)
+            print(f"{name}: {len(loaded[name])} rows -> {store_path(name)}")
+        except Exception as e:
+            print(f"{name}: failed to ingest ({e})")
+
+    if args.report and loaded:
+        report = memory_report({name: pd.read_csv(local_source(name)) for name in loaded})
+        report = report.join(memory_report(loaded)['bytes'].rename('schema_bytes'))
+        report = report.join(memory_report({name: attach(name) for name in loaded})['mapped_bytes'].rename('mapped'))
+        report = report.drop(columns='mapped_bytes')
+        report['saved'] = (1 - report['schema_bytes'] / report['bytes']).map('{:.0%}'.format)
+        print(report.to_string())
@@ -0,0 +1,116 @@
+"""Offline embedding stage for the "Interactive Word Cloud for All Clusters" section.
+
+Takes the keywords of each cluster of free-text answers and lays them out
+with t-SNE. The clusters are the `Cluster` assignment stored in
+principal_components_steamlit.csv, which the PCA chart also draws, so both
+sections show the same clusters; each cluster's `Top_Words` come first,
+followed by its highest-weighted TF-IDF terms. The result is written next
+to that file together with its SHA-256, so the app only recomputes it when
+the answers or their clusters change:
+
+    python embeddings.py [--force]
+"""
+import argparse
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent
+SOURCE_PATH = BASE_DIR / "principal_components_steamlit.csv"
+OUTPUT_PATH = BASE_DIR / "word_cloud_embeddings_steamlit.csv"
+META_PATH = OUTPUT_PATH.with_suffix('.json')
+
+TOP_WORDS = 10
+JITTER = 0.2
+RANDOM_STATE = 42
+
+
+def source_hash(path=SOURCE_PATH):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def cluster_keywords(tfidf, terms, members, top_words):
+    """Column indices of a cluster's keywords: its stored Top_Words, then its heaviest TF-IDF terms."""
+    vocabulary = {term: column for column, term in enumerate(terms)}
+    keywords = []
+    for word in top_words:
+        if word in vocabulary and vocabulary[word] not in keywords:
+            keywords.append(vocabulary[word])
+    centroid = np.asarray(tfidf[members].mean(axis=0)).ravel()
+    for column in centroid.argsort()[::-1]:
+        if len(keywords) >= TOP_WORDS or centroid[column] == 0:
+            break
+        if column not in keywords:
+            keywords.append(column)
+    return np.array(keywords)
+
+
+def compute_embeddings(answers):
+    """One row per (cluster, keyword) with its 2-D t-SNE position.
+
+    `answers` holds the Text, Cluster and Top_Words columns of the PCA file.
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.manifold import TSNE
+    from sklearn.preprocessing import StandardScaler
+
+    vectorizer = TfidfVectorizer(stop_words='english')
+    tfidf = vectorizer.fit_transform(answers['Text'].fillna('').astype(str))
+    terms = vectorizer.get_feature_names_out()
+    rng = np.random.default_rng(RANDOM_STATE)
+
+    clusters = []
+    for cluster, members in answers.groupby('Cluster').indices.items():
+        top_words = [word.strip() for word in str(answers['Top_Words'].iloc[members[0]]).split(',')]
+        top = cluster_keywords(tfidf, terms, members, top_words)
+        if len(top) < 3:
+            # Too few keywords for t-SNE; lay them out side by side
+            coordinates = np.column_stack([np.arange(len(top)), np.zeros(len(top))]).astype(float)
+        else:
+            # A keyword's vector is its TF-IDF weight in every answer
+            word_vectors = StandardScaler().fit_transform(tfidf[:, top].T.toarray())
+            perplexity = min(50, len(top) - 1)
+            coordinates = TSNE(n_components=2, perplexity=perplexity, init='random',
+                               random_state=RANDOM_STATE).fit_transform(word_vectors)
+        coordinates += rng.normal(scale=JITTER, size=coordinates.shape)
+        clusters.append(pd.DataFrame({
+            'Cluster': cluster,
+            'Word': terms[top],
+            'x': coordinates[:, 0],
+            'y': coordinates[:, 1],
+        }))
+    return pd.concat(clusters, ignore_index=True)
+
+
+def build_embeddings(digest=None):
+    digest = digest or source_hash()
+    embeddings = compute_embeddings(pd.read_csv(SOURCE_PATH))
+    embeddings.to_csv(OUTPUT_PATH, index=False)
+    META_PATH.write_text(json.dumps({
+        'source_sha256': digest,
+        'top_words': TOP_WORDS,
+    }))
+    return embeddings
+
+
+def load_embeddings():
+    """Stored word-cloud coordinates, rebuilt only if the source text hash changed."""
+    digest = source_hash()
+    try:
+        meta = json.loads(META_PATH.read_text())
+    except (OSError, ValueError):
+        meta = {}
+    if meta.get('source_sha256') == digest and OUTPUT_PATH.exists():
+        return pd.read_csv(OUTPUT_PATH)
+    return build_embeddings(digest)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Precompute word-cloud embeddings.")
+    parser.add_argument('--force', action='store_true', help="recompute even if the source is unchanged")
+    args = parser.parse_args()
+    embeddings = build_embeddings() if args.force else load_embeddings()
+    print(f"{len(embeddings)} keywords in {embeddings['Cluster'].nunique()} clusters -> {OUTPUT_PATH.name}")
@@ -0,0 +1,255 @@
+import json
+import os
+import warnings
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+try:
+    from streamlit.proto.PlotlyChart_pb2 import PlotlyChart as PlotlyChartProto
+except ImportError:
+    PlotlyChartProto = None
+
+import geo
+import lazy
+
+# Plotly is imported when the first figure is built, not at app start
+px = lazy.module('plotly.express')
+go = lazy.module('plotly.graph_objects')
+plotly_utils = lazy.module('plotly.utils')
+
+# Serialized figures above this size trigger a warning (override with FIGURE_BYTE_BUDGET)
+FIGURE_BYTE_BUDGET = int(os.environ.get('FIGURE_BYTE_BUDGET', 2 * 1024 * 1024))
+
+# Bar charts with more categories than this fold the rest into a single
+# "Other" bar (override with CHART_MAX_CATEGORIES; 0 disables folding)
+MAX_CATEGORIES = int(os.environ.get('CHART_MAX_CATEGORIES', 30))
+OTHER_LABEL = "Other"
+OTHER_COLOR = '#b0b0b0'
+
+# 'builtin' draws ISO-3 locations with Plotly's own country outlines;
+# 'bundled' embeds the outlines of the drawn countries from geometry/, for
+# deployments that cannot reach Plotly's CDN
+GEOMETRY = os.environ.get('DASH_GEOMETRY', 'builtin')
+
+# Streamlit releases whose PlotlyChart message plotly_chart_json() fills in
+# directly; any other release goes through the public st.plotly_chart
+DIRECT_CHART_VERSIONS = ('1.22.',)
+DIRECT_CHART_FIELDS = {'use_container_width', 'figure', 'theme'}
+DIRECT_CHARTS = (PlotlyChartProto is not None and st.__version__.startswith(DIRECT_CHART_VERSIONS)
+                 and DIRECT_CHART_FIELDS <= set(PlotlyChartProto.DESCRIPTOR.fields_by_name))
+
+MILK_PRICE_COLUMNS = {
+    'Raw': 'Raw milk price',
+    'Organic raw': 'Organic raw milk price',
+}
+
+
+def figure_to_json(figure):
+    return json.dumps(figure, cls=plotly_utils.PlotlyJSONEncoder)
+
+
+def check_payload(figure, label, budget=None):
+    """Return the figure's JSON size in bytes, warning when it exceeds the budget."""
+    budget = FIGURE_BYTE_BUDGET if budget is None else budget
+    size = len(figure_to_json(figure).encode())
+    if size > budget:
+        warnings.warn(f"{label}: figure JSON is {size / 1024:.0f} KiB, over the {budget / 1024:.0f} KiB budget")
+    return size
+
+
+@lru_cache(maxsize=32)
+def figure_dict(spec):
+    return json.loads(spec)
+
+
+def plotly_chart_json(spec, container=None, use_container_width=False, theme="streamlit"):
+    """Like st.plotly_chart, but for a figure already serialized to JSON.
+
+    On the Streamlit releases in DIRECT_CHART_VERSIONS the spec is sent as
+    is, without Streamlit re-validating and re-serializing the figure.
+    """
+    if not DIRECT_CHARTS:
+        return (container or st).plotly_chart(figure_dict(spec), use_container_width=use_container_width, theme=theme)
+    proto = PlotlyChartProto()
+    proto.use_container_width = use_container_width
+    proto.figure.spec = spec
+    proto.figure.config = json.dumps({'showLink': False, 'linkText': False})
+    proto.theme = theme or ""
+    return (container or st._main)._enqueue("plotly_chart", proto)
+
+
+def geometry_kwargs(locations):
+    """Trace settings that resolve ISO-3 `locations` without any name matching."""
+    if GEOMETRY == 'bundled':
+        return {'geojson': geo.geometry_subset(locations)}
+    return {'locationmode': 'ISO-3'}
+
+
+def drawable(data, location_column):
+    """Rows of `data` that can be drawn: every coded row, and with bundled geometry only codes it has outlines for.
+
+    Plotly's own outlines also cover small states (Bahrain, Singapore, Malta, ...)
+    that the bundled 1:110m file lacks, so the built-in mode keeps them.
+    """
+    codes = data[location_column]
+    if GEOMETRY == 'bundled':
+        return data[codes.isin(geo.location_index())]
+    return data[codes.notna()]
+
+
+def choropleth(data, location_column, value_column, title=None, hover_column=None, scope=None, colorscale=None,
+               **trace_kwargs):
+    """Single-trace choropleth with locations in sorted ISO-3 order.
+
+    Rows that cannot be drawn are dropped (see drawable()).
+    """
+    located = drawable(data, location_column)
+    locations = located[location_column].astype(str).to_numpy()
+    order = np.argsort(locations, kind='stable')
+    trace = go.Choropleth(locations=locations[order], z=located[value_column].to_numpy()[order],
+                          colorscale=colorscale or px.colors.sequential.Plasma, colorbar_title_text=value_column,
+                          **geometry_kwargs(locations), **trace_kwargs)
+    if hover_column:
+        trace.update(hovertext=located[hover_column].astype(str).to_numpy()[order], hoverinfo='text+z')
+    figure = go.Figure(trace).update_layout(title=title)
+    if scope:
+        figure.update_geos(scope=scope)
+    if GEOMETRY == 'bundled':
+        # Only the embedded outlines; no base map is fetched
+        figure.update_geos(visible=False, fitbounds='locations')
+    return figure
+
+
+def frame_slider(frames, prefix="Year: "):
+    """Plotly slider that switches between `frames` in the browser.
+
+    Moving it applies the frame's data arrays to the existing traces, like a
+    restyle, without a Streamlit rerun or a new figure being sent.
+    """
+    return [{
+        'active': 0,
+        'currentvalue': {'prefix': prefix},
+        'pad': {'t': 30},
+        'steps': [{'args': [[frame.name], {'frame': {'duration': 0, 'redraw': True},
+                                           'mode': 'immediate',
+                                           'transition': {'duration': 0}}],
+                   'label': frame.name,
+                   'method': 'animate'} for frame in frames],
+    }]
+
+
+# `_data` is not hashed; `version` (from loaders.dataset_version) stands in for it
+@st.cache_data(max_entries=16)
+def partner_map_frames_json(_data, version, title, color="Valueinthousandeuro"):
+    """Partner map for every year at once; each yearly frame only carries z."""
+    figure = animated_choropleth(_data, 'year', "Alpha-3code_Partner", [color], [color], hover_column="Partner",
+                                 colorscale=px.colors.sequential.Plasma, colorbar_title_text=color,
+                                 hoverinfo='text+z')
+    figure.update_layout(title=title, sliders=frame_slider(figure.frames))
+    return figure_to_json(figure)
+
+
+@st.cache_data(max_entries=16)
+def milk_price_frames_json(_data, version, milk_type):
+    column = MILK_PRICE_COLUMNS[milk_type]
+    figure = animated_choropleth(_data, 'year', "Alpha-3code_Country", [column], [column], hover_column="Country",
+                                 colorscale=px.colors.sequential.Plasma, colorbar_title_text=column,
+                                 hoverinfo='text+z')
+    figure.update_layout(title=f"{milk_type} milk price (Euros per 100Kg)", geo_scope="europe",
+                         sliders=frame_slider(figure.frames))
+    return figure_to_json(figure)
+
+
+def fold_tail(data, category, value, limit=None):
+    """Labels and values of `data`'s bars, largest first, with the long tail summed into one bar.
+
+    At most `limit` bars are returned; the last one is "Other (n)" when
+    more than `limit` categories are present.
+    """
+    limit = MAX_CATEGORIES if limit is None else limit
+    ordered = data.sort_values(value, ascending=False, kind='stable')
+    labels = ordered[category].astype(str).to_numpy()
+    values = ordered[value].to_numpy()
+    if limit and len(labels) > limit:
+        labels = np.append(labels[:limit - 1], f"{OTHER_LABEL} ({len(labels) - limit + 1})")
+        values = np.append(values[:limit - 1], values[limit - 1:].sum())
+    return labels, values
+
+
+def bar_figure(data, category, value, title=None, orientation='v', color=None, palette=None, limit=None):
+    """Bar chart of `value` per `category` as a single trace, folding the tail into "Other".
+
+    Per-category colours (`palette`) are set on the bars' markers instead of
+    splitting the chart into one trace per category, so the payload grows
+    with the number of bars only.
+    """
+    labels, values = fold_tail(data, category, value, limit)
+    folded = len(labels) < len(data)
+    if palette:
+        colors = [palette[i % len(palette)] for i in range(len(labels))]
+        if folded:
+            colors[-1] = OTHER_COLOR
+    else:
+        colors = color
+    if orientation == 'h':
+        trace = go.Bar(x=values, y=labels, orientation='h', marker_color=colors,
+                       hovertemplate='%{y}: %{x:.2f}<extra></extra>')
+        axes = {'xaxis_title': value, 'yaxis_title': category}
+    else:
+        trace = go.Bar(x=labels, y=values, marker_color=colors, hovertemplate='%{x}: %{y:.2f}<extra></extra>')
+        axes = {'xaxis_title': category, 'yaxis_title': value}
+    return go.Figure(trace).update_layout(title=title, **axes)
+
+
+def split_frames(data, frame_column):
+    """Split `data` into {frame value: rows} with one sort instead of one mask per frame."""
+    ordered = data.sort_values(frame_column, kind='stable')
+    keys = ordered[frame_column].to_numpy()
+    bounds = np.append(np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]), len(keys))
+    return {keys[start]: ordered.iloc[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])}
+
+
+def animated_choropleth(data, frame_column, location_column, value_columns, names,
+                        hover_column=None, packed=True, **trace_kwargs):
+    """Animated choropleth with one trace per value column and one frame per `frame_column` value.
+
+    Packed mode sends locations and hover text once on the base traces and
+    only each frame's z arrays (aligned to the same location order), so the
+    payload grows with frames x locations instead of frames x full traces.
+    `location_column` holds ISO-3 codes; locations are in sorted order and
+    rows that cannot be drawn are dropped (see drawable()). Without any
+    drawable row the figure is empty.
+    """
+    data = drawable(data, location_column)
+    if data.empty:
+        return go.Figure()
+    wide = data.groupby([frame_column, location_column], observed=True)[list(value_columns)].first().unstack(location_column)
+    locations = pd.Index(sorted(wide.columns.get_level_values(location_column).unique().astype(str)))
+    hovertext = None
+    if hover_column:
+        hovertext = data.groupby(location_column, observed=True)[hover_column].first().reindex(locations).astype(str)
+
+    first_frame = wide.index[0]
+    z_min = {column: wide[column].min().min() for column in value_columns}
+    z_max = {column: wide[column].max().max() for column in value_columns}
+
+    def trace(column, frame, full):
+        z = wide.loc[frame, column].reindex(locations).to_numpy()
+        if not full:
+            return go.Choropleth(z=z)
+        return go.Choropleth(locations=list(locations), z=z, hovertext=hovertext,
+                             zmin=z_min[column], zmax=z_max[column], **geometry_kwargs(locations), **trace_kwargs)
+
+    figure = go.Figure()
+    for column, name in zip(value_columns, names):
+        figure.add_trace(trace(column, first_frame, full=True).update(name=name))
+    figure.frames = [
+        go.Frame(data=[trace(column, frame, full=not packed) for column in value_columns],
+                 traces=list(range(len(value_columns))),
+                 name=str(frame))
+        for frame in wide.index
+    ]
+    return figure
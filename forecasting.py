@@ -0,0 +1,305 @@
+"""Offline forecasting stage behind the "Forecasted Quantity" section.
+
+The export sources only hold annual totals, so the model works on years:
+for every product group one RandomForestRegressor learns next year's
+quantity from a series' previous LAG_YEARS years (log scale, pooled over
+all partners of the group), and the groups are trained in a process pool.
+The predicted annual total of each active (Partner, ProductGroup) series
+is split over the months by a seasonal profile: the source's own months
+when it has them, otherwise the month shares of that series in the
+forecasts currently published (the bundled ones were built from monthly
+data), then its product group's, then an even split.
+
+A run is written as a new version under .store/forecasts/<version>/, one
+Arrow file per year-month partition. Publishing a version replaces only
+the retrained series in best_prediction_df; every other series keeps its
+rows. Running apps pick the result up on their next rerun.
+
+    python forecasting.py                     # train a new version and publish it
+    python forecasting.py --no-publish        # train only
+    python forecasting.py --publish VERSION   # (re)publish an existing version
+
+The dashboard only offers its "Retrain forecasts" button when
+DASH_ALLOW_RETRAIN=1 is set.
+"""
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+
+import data_store
+
+FORECASTS_DIR = data_store.STORE_DIR / "forecasts"
+CURRENT_PATH = FORECASTS_DIR / "CURRENT"
+RUNNING_PATH = FORECASTS_DIR / "running.pid"
+LOG_PATH = FORECASTS_DIR / "forecasting.log"
+SOURCE = 'exports_data'
+TARGET = 'best_prediction_df'
+SERIES = ['Partner', 'ProductGroup']
+FORECAST_COLUMNS = ['MonthDate', 'year', 'month', 'Partner', 'ProductGroup', 'RF_ForecastedQuantity']
+MONTHS = np.arange(1, 13)
+TREES = 100
+KEEP_VERSIONS = 3
+# Years of history a forecast is made from; a series is forecast only if it
+# traded in at least one of them
+LAG_YEARS = 3
+# Retraining from the dashboard starts a multi-process job, so it is opt-in
+RETRAIN_ENABLED = os.environ.get('DASH_ALLOW_RETRAIN', '') not in ('', '0')
+
+
+def annual_series(data):
+    """Quantity per (Partner, ProductGroup) series and year; years a series did not trade are 0."""
+    totals = data.groupby([*SERIES, 'year'], observed=True)['Quantityintonnes'].sum()
+    wide = totals.unstack('year', fill_value=0.0)
+    years = range(int(wide.columns.min()), int(wide.columns.max()) + 1)
+    return wide.reindex(columns=years, fill_value=0.0)
+
+
+def fit_group(product_group, history, active, steps, trees):
+    """Fit one product group's model and forecast its active series `steps` years ahead; runs in a worker.
+
+    `history` is log1p(quantity) with one row per series and one column per year.
+    """
+    # Imported here so the dashboard can import this module without loading scikit-learn
+    from sklearn.ensemble import RandomForestRegressor
+
+    windows = np.lib.stride_tricks.sliding_window_view(history, LAG_YEARS + 1, axis=1).reshape(-1, LAG_YEARS + 1)
+    model = RandomForestRegressor(n_estimators=trees, random_state=0, n_jobs=1)
+    model.fit(windows[:, :LAG_YEARS], windows[:, LAG_YEARS])
+    recent = history[active, -LAG_YEARS:]
+    for _ in range(steps):
+        predicted = model.predict(recent)
+        recent = np.column_stack([recent[:, 1:], predicted])
+    return product_group, np.clip(np.expm1(predicted), 0, None)
+
+
+def month_shares(monthly, value):
+    """Each month's share of its year, per series and per product group, from (SERIES, year, month, `value`) rows."""
+    monthly = monthly.astype({column: str for column in SERIES})
+
+    def shares(keys):
+        by_month = monthly.groupby([*keys, 'month'])[value].sum().unstack('month').reindex(columns=MONTHS, fill_value=0)
+        by_month = by_month.fillna(0)
+        total = by_month.sum(axis=1)
+        return by_month[total > 0].div(total[total > 0], axis=0)
+
+    return shares(SERIES), shares(['ProductGroup'])
+
+
+def seasonal_profile(series, shares):
+    """(n series x 12) month shares for `series` (a SERIES frame), falling back to product group, then even."""
+    by_series, by_group = shares
+    keys = series.astype(str)
+    profile = by_series.reindex(pd.MultiIndex.from_frame(keys)).to_numpy(dtype=float)
+    group = by_group.reindex(keys['ProductGroup']).to_numpy(dtype=float)
+    missing = np.isnan(profile).any(axis=1)
+    profile[missing] = group[missing]
+    profile[np.isnan(profile).any(axis=1)] = 1 / 12
+    return profile
+
+
+def seasonality_source(data, published):
+    """(label, shares) of the monthly data the seasonal profile is taken from."""
+    if 'month' in data.columns:
+        return 'source months', month_shares(data, 'Quantityintonnes')
+    if published is not None and not published.empty:
+        return 'published forecasts', month_shares(published, 'RF_ForecastedQuantity')
+    return 'even', (pd.DataFrame(columns=MONTHS, dtype=float), pd.DataFrame(columns=MONTHS, dtype=float))
+
+
+def forecast(data, year=None, workers=None, trees=TREES, shares=None):
+    """Monthly forecasts for `year` (default: the year after the last one observed).
+
+    Only series that traded in the last LAG_YEARS years are forecast; the
+    result is empty when none did.
+    `shares` comes from seasonality_source(); without it months are even.
+    """
+    wide = annual_series(data)
+    last_year = int(wide.columns.max())
+    year = last_year + 1 if year is None else year
+    if year <= last_year:
+        raise ValueError(f"{year} is not after the last observed year {last_year}")
+    if len(wide.columns) <= LAG_YEARS:
+        raise ValueError(f"{len(wide.columns)} years of history; at least {LAG_YEARS + 1} are needed")
+
+    history = np.log1p(wide.to_numpy())
+    active = history[:, -LAG_YEARS:].any(axis=1)
+    product_groups = wide.index.get_level_values('ProductGroup')
+    tasks, forecast_rows = [], []
+    for group in product_groups.unique():
+        rows = np.flatnonzero(product_groups == group)
+        if active[rows].any():
+            tasks.append((group, history[rows], active[rows], year - last_year, trees))
+            forecast_rows.append(rows[active[rows]])
+    if not tasks:
+        return data_store.apply_schema(pd.DataFrame(columns=FORECAST_COLUMNS), data_store.schema(TARGET))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        fitted = dict(pool.map(fit_group, *zip(*tasks)))
+
+    series = wide.index[np.concatenate(forecast_rows)].to_frame(index=False)
+    annual = np.concatenate([fitted[task[0]] for task in tasks])
+    if shares is None:
+        shares = seasonality_source(data, None)[1]
+    quantities = annual[:, None] * seasonal_profile(series, shares)
+
+    forecasts = pd.DataFrame({
+        'MonthDate': np.tile(pd.to_datetime([f"{year}-{month:02d}-01" for month in MONTHS]), len(series)),
+        'year': year,
+        'month': np.tile(MONTHS, len(series)),
+        'Partner': np.repeat(series['Partner'].to_numpy(), 12),
+        'ProductGroup': np.repeat(series['ProductGroup'].to_numpy(), 12),
+        'RF_ForecastedQuantity': quantities.ravel(),
+    })
+    return data_store.apply_schema(forecasts, data_store.schema(TARGET))
+
+
+def version_dir(version):
+    return FORECASTS_DIR / version
+
+
+def versions():
+    """Trained versions, oldest first."""
+    return sorted(path.name for path in FORECASTS_DIR.glob('*') if (path / "manifest.json").exists())
+
+
+def current_version():
+    try:
+        return CURRENT_PATH.read_text().strip() or None
+    except OSError:
+        return None
+
+
+def new_version():
+    """Create the directory of a new version named after the current time; names sort oldest first.
+
+    The microseconds, and a counter if even those collide, keep two runs
+    started in the same second from writing into one version.
+    """
+    now = time.time()
+    stamp = time.strftime('%Y%m%dT%H%M%S', time.localtime(now)) + f".{int(now % 1 * 1e6):06d}"
+    FORECASTS_DIR.mkdir(parents=True, exist_ok=True)
+    for counter in itertools.count():
+        version = stamp if counter == 0 else f"{stamp}-{counter}"
+        try:
+            version_dir(version).mkdir()
+            return version
+        except FileExistsError:
+            continue
+
+
+def write_version(forecasts, manifest):
+    """Store `forecasts` as a new version, one file per year-month partition; returns its name."""
+    version = new_version()
+    path = version_dir(version)
+    for values, part in forecasts.groupby(data_store.PARTITION_COLUMNS[TARGET], observed=True):
+        feather.write_feather(part.reset_index(drop=True), path / f"{data_store.partition_key(values)}.arrow",
+                              compression='uncompressed')
+    (path / "manifest.json").write_text(json.dumps({'version': version, 'rows': len(forecasts), **manifest}))
+    return version
+
+
+def series_index(data):
+    return pd.MultiIndex.from_frame(data[SERIES].astype(str))
+
+
+def publish(version):
+    """Make `version` the forecasts served by the app; returns the partitions that changed.
+
+    Only the series in `version` are replaced. Rows of every other series in
+    the same months are carried over, so series that were not retrained
+    (e.g. without recent export history) keep their current forecasts.
+    """
+    forecasts = pd.concat([feather.read_feather(path) for path in sorted(version_dir(version).glob('*.arrow'))],
+                          ignore_index=True)
+    current = data_store.load(TARGET)
+    months = data_store.PARTITION_COLUMNS[TARGET]
+    in_months = pd.MultiIndex.from_frame(current[months]).isin(pd.MultiIndex.from_frame(forecasts[months]))
+    kept = current[in_months & ~series_index(current).isin(series_index(forecasts))]
+    changed = data_store.append(TARGET, pd.concat([kept, forecasts], ignore_index=True))
+    tmp_path = CURRENT_PATH.with_suffix('.tmp')
+    tmp_path.write_text(version)
+    os.replace(tmp_path, CURRENT_PATH)
+    return changed
+
+
+def prune(keep=KEEP_VERSIONS):
+    current = current_version()
+    for version in versions()[:-keep]:
+        if version != current:
+            for path in version_dir(version).iterdir():
+                path.unlink()
+            version_dir(version).rmdir()
+
+
+def is_running():
+    """True while a training run started by start_background() (or the CLI) is alive."""
+    try:
+        pid = int(RUNNING_PATH.read_text())
+        os.kill(pid, 0)
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+def start_background():
+    """Train and publish a new version in a detached process, so no session waits on it."""
+    if is_running():
+        return False
+    FORECASTS_DIR.mkdir(parents=True, exist_ok=True)
+    with LOG_PATH.open('a') as log:
+        subprocess.Popen([sys.executable, os.path.abspath(__file__)], stdout=log, stderr=subprocess.STDOUT,
+                         start_new_session=True, cwd=data_store.BASE_DIR)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train per-partner forecasts and publish them to the store.")
+    parser.add_argument('--year', type=int, help="year to forecast (default: the year after the latest data)")
+    parser.add_argument('--workers', type=int, help="training processes (default: one per CPU)")
+    parser.add_argument('--trees', type=int, default=TREES, help="trees per product-group model")
+    parser.add_argument('--no-publish', action='store_true')
+    parser.add_argument('--publish', metavar='VERSION', help="publish an already trained version and exit")
+    args = parser.parse_args()
+
+    if args.publish:
+        print(f"{args.publish}: {len(publish(args.publish))} partitions changed")
+        return
+
+    FORECASTS_DIR.mkdir(parents=True, exist_ok=True)
+    RUNNING_PATH.write_text(str(os.getpid()))
+    try:
+        start = time.perf_counter()
+        source = data_store.load(SOURCE)
+        seasonality, shares = seasonality_source(source, data_store.load(TARGET))
+        forecasts = forecast(source, args.year, args.workers, args.trees, shares)
+        seconds = round(time.perf_counter() - start, 1)
+        if forecasts.empty:
+            print(f"no series traded in the last {LAG_YEARS} years; nothing to publish")
+            return
+        version = write_version(forecasts, {
+            'source': SOURCE,
+            'source_partitions': (data_store.read_meta(SOURCE) or {}).get('partitions', {}),
+            'lag_years': LAG_YEARS,
+            'seasonality': seasonality,
+            'trees': args.trees,
+            'seconds': seconds,
+        })
+        print(f"{version}: {len(forecasts)} forecasts in {seconds}s")
+        if not args.no_publish:
+            print(f"{version}: published, {len(publish(version))} partitions changed")
+        prune()
+    finally:
+        RUNNING_PATH.unlink(missing_ok=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Country names -> ISO-3 codes, and the bundled country geometry.
+
+country_codes.csv maps every country and partner name found in the sources
+to its ISO 3166-1 alpha-3 code; aggregates such as "not specified" partners
+are listed with a blank code so they are not reported as unmatched.
+geometry/countries_110m.json holds Natural Earth 1:110m country outlines
+(public domain) quantized to 0.1 degree, one feature per ISO-3 id. Rebuild it
+from a Natural Earth GeoJSON export with
+
+    python geo.py --build-geometry ne_110m_admin_0_countries.geojson
+"""
+import argparse
+import json
+from functools import lru_cache
+from pathlib import Path
+
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent
+CODES_PATH = BASE_DIR / "country_codes.csv"
+GEOMETRY_PATH = BASE_DIR / "geometry" / "countries_110m.json"
+PRECISION = 1
+
+# Natural Earth features without an official ISO-3 code
+GEOMETRY_IDS = {
+    'Kosovo': 'XKX',
+}
+
+
+@lru_cache(maxsize=1)
+def country_codes():
+    codes = pd.read_csv(CODES_PATH, keep_default_na=False)
+    return dict(zip(codes['name'], codes['iso3']))
+
+
+def to_iso3(names):
+    """ISO-3 codes for a Series of names, plus the names that have no entry.
+
+    Each distinct name is looked up once. Known aggregates map to None
+    without being reported.
+    """
+    codes = country_codes()
+    distinct = names.dropna().unique()
+    mapped = names.map({name: codes.get(name) or None for name in distinct})
+    unmatched = sorted(str(name) for name in distinct if name not in codes)
+    return mapped, unmatched
+
+
+@lru_cache(maxsize=1)
+def geometry():
+    return json.loads(GEOMETRY_PATH.read_text())
+
+
+@lru_cache(maxsize=1)
+def location_index():
+    """ISO-3 ids of every country with bundled geometry, in a fixed (sorted) order."""
+    return pd.Index(sorted(feature['id'] for feature in geometry()['features']))
+
+
+def geometry_subset(locations):
+    """FeatureCollection with only the features for `locations`."""
+    wanted = set(locations)
+    return {'type': 'FeatureCollection',
+            'features': [feature for feature in geometry()['features'] if feature['id'] in wanted]}
+
+
+def quantize_ring(ring, precision):
+    points = []
+    for x, y in ring:
+        point = [round(x, precision), round(y, precision)]
+        if not points or points[-1] != point:
+            points.append(point)
+    return points if len(points) >= 4 else None
+
+
+def build_geometry(source, precision=PRECISION):
+    """Quantize a Natural Earth GeoJSON export into the bundled geometry file."""
+    features = []
+    for feature in json.loads(Path(source).read_text())['features']:
+        properties = feature['properties']
+        name = properties.get('name') or properties.get('NAME')
+        iso3 = GEOMETRY_IDS.get(name, properties.get('iso_a3') or properties.get('ISO_A3'))
+        if not iso3 or iso3 == '-99':
+            continue
+        shape = feature['geometry']
+        polygons = shape['coordinates'] if shape['type'] == 'MultiPolygon' else [shape['coordinates']]
+        coordinates = []
+        for polygon in polygons:
+            rings = [quantize_ring(ring, precision) for ring in polygon]
+            if rings[0] is not None:
+                coordinates.append([ring for ring in rings if ring is not None])
+        features.append({'type': 'Feature', 'id': iso3, 'properties': {'name': name},
+                         'geometry': {'type': 'MultiPolygon', 'coordinates': coordinates}})
+    features.sort(key=lambda feature: feature['id'])
+    GEOMETRY_PATH.parent.mkdir(exist_ok=True)
+    GEOMETRY_PATH.write_text(json.dumps({'type': 'FeatureCollection', 'features': features}, separators=(',', ':')))
+    return len(features)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Maintain the bundled country codes and geometry.")
+    parser.add_argument('--build-geometry', metavar='GEOJSON', help="rebuild the geometry cache from Natural Earth")
+    parser.add_argument('--precision', type=int, default=PRECISION, help="decimal places kept in coordinates")
+    args = parser.parse_args()
+
+    if args.build_geometry:
+        print(f"{build_geometry(args.build_geometry, args.precision)} countries -> {GEOMETRY_PATH}")
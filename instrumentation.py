@@ -0,0 +1,83 @@
+"""Opt-in timing of data loads, filters and figure builds.
+
+Set DASH_PROFILE=1 to append one JSON record per measured step to
+DASH_PROFILE_LOG (profile.jsonl by default):
+
+    {"run": "3f2a9c1d", "section": "forecast", "phase": "filter", "ms": 0.4, "rows": 10, ...}
+
+Records from the same script rerun share a `run` id.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+import streamlit as st
+
+ENABLED = os.environ.get('DASH_PROFILE', '') not in ('', '0')
+LOG_PATH = Path(os.environ.get('DASH_PROFILE_LOG', Path(__file__).resolve().parent / 'profile.jsonl'))
+SUMMARY_RECORDS = 5000
+
+_lock = threading.Lock()
+
+
+def start_run():
+    """Tag the records of this script rerun with a fresh id."""
+    if ENABLED:
+        st.session_state['profile_run'] = uuid.uuid4().hex[:8]
+
+
+def current_run():
+    try:
+        return st.session_state.get('profile_run')
+    except Exception:
+        # No script run context (benchmarks, offline scripts)
+        return None
+
+
+def record(section, phase, ms, run=None, **fields):
+    """Log one step; `run` defaults to the current rerun's id (pass it from worker threads)."""
+    if not ENABLED:
+        return
+    entry = {'ts': round(time.time(), 3), 'run': run or current_run(), 'section': section, 'phase': phase,
+             'ms': round(ms, 3), **fields}
+    line = json.dumps(entry, default=str)
+    with _lock, LOG_PATH.open('a') as log:
+        log.write(line + '\n')
+
+
+@contextmanager
+def measure(section, phase, run=None, **fields):
+    """Time the block; the caller may add e.g. `rows` or `bytes` to the yielded dict."""
+    start = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        record(section, phase, (time.perf_counter() - start) * 1000, run=run, **fields)
+
+
+def summary(limit=SUMMARY_RECORDS):
+    """p50/p95 milliseconds per (section, phase) over the most recent records."""
+    try:
+        lines = LOG_PATH.read_text().splitlines()[-limit:]
+    except OSError:
+        return pd.DataFrame()
+    records = pd.DataFrame([json.loads(line) for line in lines if line])
+    if records.empty:
+        return records
+    grouped = records.groupby(['section', 'phase'])['ms']
+    return pd.DataFrame({
+        'count': grouped.size(),
+        'p50_ms': grouped.quantile(0.5).round(2),
+        'p95_ms': grouped.quantile(0.95).round(2),
+    })
+
+
+def show_summary():
+    if ENABLED and st.sidebar.checkbox("Show profiling summary"):
+        st.sidebar.subheader("Latency (p50 / p95)")
+        st.sidebar.dataframe(summary())
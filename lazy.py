@@ -0,0 +1,36 @@
+"""Deferred imports for libraries that only some sections need.
+
+    px = lazy.module('plotly.express')
+
+binds `px` to a stand-in module; the real import happens on the first
+attribute access (e.g. `px.bar`), so a session that never reaches a chart
+never pays for Plotly. benchmarks/import_time.py reports what each app
+still imports up front.
+"""
+import importlib
+import threading
+import types
+
+
+class LazyModule(types.ModuleType):
+    def __init__(self, name):
+        super().__init__(name)
+        self._lock = threading.Lock()
+        self._module = None
+
+    def _load(self):
+        # Sessions run in threads; only one of them performs the import
+        with self._lock:
+            if self._module is None:
+                self._module = importlib.import_module(self.__name__)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def module(name):
+    return LazyModule(name)
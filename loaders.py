@@ -0,0 +1,193 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import streamlit as st
+
+import data_store
+import instrumentation
+
+# Seconds a loaded dataset stays cached; the forecast file is refreshed more often
+DEFAULT_TTL = 24 * 60 * 60
+DATASET_TTLS = {
+    'best_prediction_df': 10 * 60,
+}
+MAX_ENTRIES = 16
+MAX_BYTES = 512 * 1024 * 1024
+
+# Seconds to wait on a remote fetch, and how often to retry it before giving up
+DEFAULT_TIMEOUT = 20
+SOURCE_TIMEOUTS = {
+    'imports_data': 60,
+    'exports_data': 60,
+}
+RETRIES = 2
+RETRY_BACKOFF = 1.0
+LOADER_THREADS = 8
+
+
+class DatasetCache:
+    """Process-wide LRU of loaded datasets with per-dataset TTLs and a byte budget.
+
+    Entries are keyed by dataset name only, so reloading a dataset replaces its
+    previous frame instead of keeping both copies alive.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._loading = {}
+
+    def _fresh(self, name, signature):
+        entry = self._entries.get(name)
+        if entry is not None and entry['expires_at'] > time.monotonic() and entry['signature'] == signature:
+            self._entries.move_to_end(name)
+            return entry['data']
+        return None
+
+    def get(self, name, timeout=None):
+        signature = data_store.store_signature(name)
+        with self._lock:
+            data = self._fresh(name, signature)
+            if data is not None:
+                return data
+            loading = self._loading.setdefault(name, threading.Lock())
+        # Only loads of the same dataset wait for each other
+        with loading:
+            with self._lock:
+                data = self._fresh(name, signature)
+                if data is not None:
+                    return data
+                # Drop the stale copy before loading so two versions are never held at once
+                self._entries.pop(name, None)
+            data = data_store.load(name, timeout)
+            self._store(name, signature, data)
+            return data
+
+    def _store(self, name, signature, data):
+        with self._lock:
+            ttl = DATASET_TTLS.get(name, DEFAULT_TTL)
+            self._entries[name] = {
+                'data': data,
+                'signature': signature,
+                'expires_at': time.monotonic() + ttl,
+                'nbytes': int(data.memory_usage(deep=True).sum()),
+                'partitions': (data_store.read_meta(name) or {}).get('partitions', {}),
+            }
+            self._versions[name] = self._versions.get(name, 0) + 1
+            self._evict(keep=name)
+
+    def version(self, name):
+        """Counter bumped each time `name` is reloaded, for keying derived caches."""
+        with self._lock:
+            return self._versions.get(name, 0)
+
+    def partitions(self, name):
+        """Digest of each year/month partition of the loaded copy of `name`."""
+        with self._lock:
+            entry = self._entries.get(name)
+            return entry['partitions'] if entry is not None else {}
+
+    def invalidate(self, name=None):
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+    def nbytes(self):
+        with self._lock:
+            return sum(entry['nbytes'] for entry in self._entries.values())
+
+    def _evict(self, keep):
+        total = sum(entry['nbytes'] for entry in self._entries.values())
+        for name in list(self._entries):
+            if len(self._entries) <= self.max_entries and total <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            total -= self._entries.pop(name)['nbytes']
+
+
+@st.cache_resource
+def get_dataset_cache():
+    return DatasetCache()
+
+
+def load_data(name):
+    with instrumentation.measure('data', 'load', dataset=name) as record:
+        data = get_dataset_cache().get(name)
+        record['rows'] = len(data)
+    return data
+
+
+@st.cache_resource
+def get_loader_pool():
+    return ThreadPoolExecutor(max_workers=LOADER_THREADS, thread_name_prefix='dataset-loader')
+
+
+def _load_with_retries(cache, name, run):
+    timeout = SOURCE_TIMEOUTS.get(name, DEFAULT_TIMEOUT)
+    for attempt in range(RETRIES + 1):
+        try:
+            # Pool threads have no script run context, so the rerun's id is passed in
+            with instrumentation.measure('data', 'load', run=run, dataset=name, attempt=attempt) as record:
+                data = cache.get(name, timeout)
+                record['rows'] = len(data)
+            return data
+        except OSError:
+            # Network errors and timeouts; anything else (e.g. a malformed CSV) fails immediately
+            if attempt == RETRIES:
+                raise
+            time.sleep(RETRY_BACKOFF * 2 ** attempt)
+
+
+def load_all(names):
+    """Start loading every dataset in `names` concurrently; returns {name: future}."""
+    cache = get_dataset_cache()
+    pool = get_loader_pool()
+    run = instrumentation.current_run()
+    return {name: pool.submit(_load_with_retries, cache, name, run) for name in names}
+
+
+def as_loaded(pending):
+    """Yield (name, dataset) from load_all() in completion order; the dataset is None if it failed."""
+    names = {future: name for name, future in pending.items()}
+    for future in as_completed(names):
+        try:
+            yield names[future], future.result()
+        except Exception:
+            yield names[future], None
+
+
+def dataset_version(*names):
+    cache = get_dataset_cache()
+    return tuple(cache.version(name) for name in names)
+
+
+def partition_version(name, *key):
+    """Digest of one partition (e.g. a year) of `name`.
+
+    Keying a figure on this instead of dataset_version() keeps it cached
+    when data is appended for other years only.
+    """
+    return dataset_partitions(name).get(data_store.partition_key(key))
+
+
+def dataset_partitions(name):
+    return get_dataset_cache().partitions(name)
+
+
+def changed_partitions(name, previous):
+    """Partition keys of `name` whose digest differs from the {key: digest} in `previous`."""
+    current = dataset_partitions(name)
+    return sorted(key for key in current.keys() | previous.keys() if current.get(key) != previous.get(key))
+
+
+def invalidate(name=None):
+    """Forget a cached dataset (or all of them) after its source CSV changed."""
+    get_dataset_cache().invalidate(name)
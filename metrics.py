@@ -0,0 +1,73 @@
+"""Derived metric columns computed once at ingest and stored with each dataset.
+
+    Value_per_tonne   Valueinthousandeuro / Quantityintonnes
+    Quantity_share    share of the year's total (within the product group for trade data)
+    Value_share
+    Quantity_yoy      change on the same series' previous year (0.1 = +10%),
+    Value_yoy         NaN when that year is missing
+
+Charts switch between these by column name without computing anything.
+"""
+import numpy as np
+import pandas as pd
+
+MEASURES = {'Quantityintonnes': 'Quantity', 'Valueinthousandeuro': 'Value'}
+
+# Dataset -> columns identifying one series over the years, and the columns
+# (besides year) whose total a row's share is taken of
+DERIVED = {
+    'imports_data': {'series': ['Partner', 'ProductGroup'], 'share_of': ['ProductGroup']},
+    'exports_data': {'series': ['Partner', 'ProductGroup'], 'share_of': ['ProductGroup']},
+    'ireland_totals_by_partner': {'series': ['Partner'], 'share_of': []},
+    'ireland_totals_by_product_group': {'series': ['ProductGroup'], 'share_of': []},
+}
+
+DERIVED_COLUMNS = ['Value_per_tonne'] + [f"{label}_{kind}" for label in MEASURES.values() for kind in ('share', 'yoy')]
+
+
+def affected_years(years):
+    """Years whose derived columns depend on the rows of `years`: those years and the next ones (year-over-year)."""
+    return sorted({int(year) for year in years} | {int(year) + 1 for year in years})
+
+
+def derived_columns(data, spec):
+    """{column: float32 Series indexed like `data`} of every derived column."""
+    quantity = data['Quantityintonnes'].to_numpy()
+    value = data['Valueinthousandeuro'].to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        columns = {'Value_per_tonne': np.where(quantity > 0, value / quantity, np.nan)}
+
+    totals = data.groupby(['year', *spec['share_of']], observed=True)[list(MEASURES)].transform('sum')
+    for measure, label in MEASURES.items():
+        with np.errstate(divide='ignore', invalid='ignore'):
+            columns[f"{label}_share"] = data[measure].to_numpy() / totals[measure].to_numpy()
+
+    # Previous row of the same series, kept only when it is the previous year
+    ordered = data.sort_values([*spec['series'], 'year'], kind='stable')
+    previous = ordered.groupby(spec['series'], observed=True)[['year', *MEASURES]].shift()
+    consecutive = (ordered['year'] - previous['year']) == 1
+    for measure, label in MEASURES.items():
+        change = (ordered[measure] / previous[measure] - 1).where(consecutive & (previous[measure] > 0))
+        columns[f"{label}_yoy"] = change.reindex(data.index).to_numpy()
+
+    return {column: pd.Series(values, index=data.index).astype('float32') for column, values in columns.items()}
+
+
+def derive(data, name, years=None):
+    """`data` with the derived columns of dataset `name` (re)computed from its measures.
+
+    With `years` (e.g. the years just appended), only the rows of
+    affected_years(years) are recomputed, from those years and the one
+    before each; every other row keeps its stored values.
+    """
+    spec = DERIVED.get(name)
+    if spec is None or data.empty:
+        return data
+    if years is None:
+        return data.assign(**derived_columns(data, spec))
+
+    affected = data['year'].isin(affected_years(years))
+    window = data[affected | data['year'].isin([int(year) - 1 for year in years])]
+    recomputed = derived_columns(window, spec)
+    return data.assign(**{column: data[column].where(~affected, values).astype('float32')
+                          for column, values in recomputed.items()})
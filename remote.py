@@ -0,0 +1,64 @@
+"""Conditional HTTP fetches for remote CSV sources.
+
+A downloaded file is kept next to a small JSON record of its ETag and
+Last-Modified headers, which are sent back as If-None-Match /
+If-Modified-Since on the next fetch. A 304 answer leaves the local copy
+untouched. Point DATA_REMOTE_URL at e.g. `python -m http.server` to try it
+against a local stand-in server.
+"""
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+
+def headers_path(path):
+    path = Path(path)
+    return path.with_name(path.name + '.http.json')
+
+
+def read_headers(path):
+    try:
+        return json.loads(headers_path(path).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def fetch(url, path, timeout=None):
+    """Download `url` to `path` unless the server says the local copy is current.
+
+    Returns True when new content was written, False on 304 Not Modified.
+    Network errors propagate (as OSError) so callers can fall back to the
+    last good copy.
+    """
+    path = Path(path)
+    request = urllib.request.Request(url)
+    cached = read_headers(path) if path.exists() else {}
+    if cached.get('etag'):
+        request.add_header('If-None-Match', cached['etag'])
+    if cached.get('last_modified'):
+        request.add_header('If-Modified-Since', cached['last_modified'])
+
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            body = response.read()
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return False
+        raise
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    tmp_path.write_bytes(body)
+    os.replace(tmp_path, path)
+    headers_path(path).write_text(json.dumps({
+        'url': url,
+        'etag': etag,
+        'last_modified': last_modified,
+        'fetched_at': time.time(),
+    }))
+    return True
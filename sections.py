@@ -0,0 +1,43 @@
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+
+import instrumentation
+
+
+def memoized(section, inputs, build):
+    """Return `section`'s figure, calling `build` only when that section's inputs changed.
+
+    Streamlit reruns the whole script on every widget change; keeping each
+    section's last result in session state means a widget only costs the
+    sections that actually read it.
+    """
+    built = st.session_state.setdefault('section_figures', {})
+    cached = built.get(section)
+    if cached is None or cached[0] != inputs:
+        cached = (inputs, build())
+        built[section] = cached
+        st.session_state['section_builds'] = st.session_state.get('section_builds', 0) + 1
+    return cached[1]
+
+
+@contextmanager
+def timed(section):
+    builds = st.session_state.get('section_builds', 0)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        ms = (time.perf_counter() - start) * 1000
+        rebuilt = st.session_state.get('section_builds', 0) > builds
+        st.session_state.setdefault('section_timings', {})[section] = {'ms': round(ms, 1), 'rebuilt': rebuilt}
+        instrumentation.record(section, 'render', ms, rebuilt=rebuilt)
+
+
+def show_timings():
+    timings = st.session_state.get('section_timings')
+    if timings:
+        st.sidebar.subheader("Section render times (last rerun)")
+        st.sidebar.table(pd.DataFrame.from_dict(timings, orient='index'))
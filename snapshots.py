@@ -0,0 +1,334 @@
+"""Pre-rendered figures for every combination of the dashboard's view parameters.
+
+    python snapshots.py build                      # render every view into snapshots/
+    python snapshots.py build --views trade forecast
+    python snapshots.py serve --port 8502          # static viewer, no Python per view
+
+Each figure is written gzip-compressed under snapshots/<view>/ and listed in
+snapshots/manifest.json together with the digests of the datasets it was
+rendered from and a hash of the rendering code. The live app uses the same
+files as a warm cache: lookup() returns a snapshot only while both still
+match, so a re-ingest, an append or a code change falls back to building
+the figure live until the next build.
+"""
+import argparse
+import gzip
+import hashlib
+import http.server
+import itertools
+import json
+import os
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+
+import aggregates
+import comparison
+import data_store
+import views
+
+BASE_DIR = Path(__file__).resolve().parent
+SNAPSHOT_DIR = Path(os.environ.get('DASH_SNAPSHOT_DIR', BASE_DIR / "snapshots"))
+MANIFEST_PATH = SNAPSHOT_DIR / "manifest.json"
+# Modules whose code decides what a figure looks like
+RENDER_MODULES = ['views.py', 'figures.py', 'aggregates.py', 'comparison.py', 'geo.py']
+
+
+@lru_cache(maxsize=1)
+def renderer_digest():
+    digest = hashlib.sha1()
+    for module in RENDER_MODULES:
+        digest.update((BASE_DIR / module).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def params_key(params):
+    """Manifest key of a parameter tuple; matches JSON.stringify in the static viewer."""
+    return json.dumps(list(params), separators=(',', ':'), ensure_ascii=False, default=int)
+
+
+def dataset_digests(names):
+    """{name: content digest} of the stored datasets; None for one that has not been ingested."""
+    return {name: (data_store.read_meta(name) or {}).get('digest') for name in names}
+
+
+# Every view: its parameter names, the datasets it reads, and a generator of
+# (params, spec) over all combinations the dashboard's widgets can produce
+
+def trade_views(data):
+    cube = aggregates.build_partner_cube({label: data[name] for label, name in views.TRADE_DATASETS.items()})
+    product_groups = [str(group) for group in data['imports_data']['ProductGroup'].unique()]
+    for params in itertools.product(views.TRADE_DATASETS, product_groups, views.YEAR_OPTIONS, views.MAX_RESULTS):
+        yield params, views.trade_chart(cube, *params)
+
+
+def year_ranges(years):
+    years = [int(year) for year in years]
+    return [(first, last) for first in years for last in years if first <= last]
+
+
+def partner_map_views(data):
+    version = dataset_digests(['ireland_totals_by_partner'])
+    for metric in views.PARTNER_MAP_METRICS:
+        yield (metric,), views.partner_map(data['ireland_totals_by_partner'], version, metric)
+
+
+def partner_range_map_views(data):
+    ranges = views.partner_ranges(data['ireland_totals_by_partner'])
+    for first, last in year_ranges(ranges['years']):
+        yield (first, last), views.partner_range_map(ranges, first, last)
+
+
+def product_group_views(data):
+    ranges = views.product_group_ranges(data['ireland_totals_by_product_group'])
+    for first, last in year_ranges(ranges['years']):
+        yield (first, last), views.product_group_chart(ranges, first, last)
+
+
+def comparison_views(data):
+    matrix = comparison.build_matrix(comparison.long_table([data[name] for name in comparison.REPORTER_DATASETS]))
+    for a, b in itertools.permutations(matrix['reporters'], 2):
+        for year in comparison.common_years(matrix, a, b):
+            yield (a, b, year), views.comparison_maps(matrix, a, b, year)
+
+
+def milk_price_views(data):
+    version = dataset_digests(['milk_prices_df'])
+    for milk_type in views.MILK_TYPES:
+        yield (milk_type,), views.milk_price_map(data['milk_prices_df'], version, milk_type)
+
+
+def forecast_views(data):
+    forecasts = data['best_prediction_df']
+    index = aggregates.build_forecast_index(forecasts)
+    year = forecasts['year'].unique()[0]
+    partners = [str(partner) for partner in forecasts['Partner'].unique()]
+    for partner, limit, month in itertools.product(partners, views.FORECAST_LIMITS, views.MONTH_NAMES):
+        yield (partner, limit, month), views.forecast_chart(index, partner, year, month, limit)
+
+
+VIEWS = {
+    'trade': (['Dataset', 'Product group', 'Year', 'Maximum results'], list(views.TRADE_DATASETS.values()), trade_views),
+    'partner-map': (['Metric'], ['ireland_totals_by_partner'], partner_map_views),
+    'partner-range-map': (['First year', 'Last year'], ['ireland_totals_by_partner'], partner_range_map_views),
+    'product-groups': (['First year', 'Last year'], ['ireland_totals_by_product_group'], product_group_views),
+    'comparison': (['Reporter', 'Compare with', 'Year'], comparison.REPORTER_DATASETS, comparison_views),
+    'milk-prices': (['Milk type'], ['milk_prices_df'], milk_price_views),
+    'forecast': (['Country', 'Limit', 'Month'], ['best_prediction_df'], forecast_views),
+}
+
+
+def read_manifest():
+    try:
+        return json.loads(MANIFEST_PATH.read_text())
+    except (OSError, ValueError):
+        return {'views': {}}
+
+
+def write_snapshot(view, key, spec, fingerprint):
+    """Write one figure; the file name covers its data and renderer, so a rebuild never overwrites a listed file."""
+    name = hashlib.sha1(f"{view}\0{key}\0{fingerprint}".encode()).hexdigest()[:16]
+    relative = f"{view}/{name}.json.gz"
+    body = json.dumps(spec) if isinstance(spec, list) else spec
+    path = SNAPSHOT_DIR / relative
+    if not path.exists():
+        path.write_bytes(gzip.compress(body.encode(), compresslevel=9, mtime=0))
+    return relative
+
+
+def build(selected=None):
+    """Render every combination of the `selected` views (default: all) and update the manifest."""
+    selected = selected or list(VIEWS)
+    names = sorted({name for view in selected for name in VIEWS[view][1]})
+    data = {name: data_store.load(name) for name in names}
+    manifest = read_manifest()
+
+    for view in selected:
+        params, datasets, render = VIEWS[view]
+        start = time.perf_counter()
+        digests = dataset_digests(datasets)
+        fingerprint = json.dumps([renderer_digest(), digests], sort_keys=True)
+        (SNAPSHOT_DIR / view).mkdir(parents=True, exist_ok=True)
+        entries, values, multi, size = {}, [[] for _ in params], False, 0
+        for combination, spec in render(data):
+            key = params_key(combination)
+            entries[key] = write_snapshot(view, key, spec, fingerprint)
+            size += (SNAPSHOT_DIR / entries[key]).stat().st_size
+            multi = isinstance(spec, list)
+            for seen, value in zip(values, json.loads(key)):
+                if value not in seen:
+                    seen.append(value)
+        manifest['views'][view] = {
+            'params': params,
+            'values': values,
+            'multi': multi,
+            'datasets': digests,
+            'renderer': renderer_digest(),
+            'built_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'entries': entries,
+        }
+        print(f"{view}: {len(entries)} figures, {size / 1e6:.1f} MB in {time.perf_counter() - start:.1f}s")
+
+    tmp_path = MANIFEST_PATH.with_suffix('.tmp')
+    tmp_path.write_text(json.dumps(manifest, ensure_ascii=False))
+    os.replace(tmp_path, MANIFEST_PATH)
+    prune(manifest)
+    return manifest
+
+
+def prune(manifest):
+    """Remove snapshot files that the manifest no longer lists."""
+    listed = {path for entry in manifest['views'].values() for path in entry['entries'].values()}
+    for path in SNAPSHOT_DIR.glob('*/*.json.gz'):
+        if path.relative_to(SNAPSHOT_DIR).as_posix() not in listed:
+            path.unlink(missing_ok=True)
+
+
+_manifest = {'mtime_ns': None, 'manifest': None}
+_manifest_lock = threading.Lock()
+
+
+def current_manifest():
+    """The manifest, re-read only when the build has replaced it."""
+    try:
+        mtime_ns = MANIFEST_PATH.stat().st_mtime_ns
+    except OSError:
+        return None
+    with _manifest_lock:
+        if _manifest['mtime_ns'] != mtime_ns:
+            _manifest['manifest'], _manifest['mtime_ns'] = read_manifest(), mtime_ns
+        return _manifest['manifest']
+
+
+@lru_cache(maxsize=64)
+def read_snapshot(relative):
+    return gzip.decompress((SNAPSHOT_DIR / relative).read_bytes()).decode()
+
+
+def lookup(view, params):
+    """Pre-rendered figure JSON (a list of them for multi-figure views), or None.
+
+    None when the view was never built, `params` is not a combination it
+    covers, or the datasets or rendering code have changed since the build.
+    """
+    manifest = current_manifest()
+    entry = manifest and manifest['views'].get(view)
+    if not entry or entry['renderer'] != renderer_digest() or dataset_digests(entry['datasets']) != entry['datasets']:
+        return None
+    relative = entry['entries'].get(params_key(params))
+    if relative is None:
+        return None
+    try:
+        body = read_snapshot(relative)
+    except OSError:
+        return None
+    return json.loads(body) if entry['multi'] else body
+
+
+INDEX_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Ireland's Dairy Trade Analysis</title>
+<script src="plotly.min.js"></script>
+<style>body{font-family:sans-serif;margin:2em}label{margin-right:1em}select{margin-left:.3em}</style>
+</head><body>
+<h1>Ireland's Dairy Trade Analysis</h1>
+<p><label>View<select id="view"></select></label><span id="params"></span></p>
+<p id="status"></p><div id="figures"></div>
+<script>
+let manifest;
+const view = document.getElementById('view'), params = document.getElementById('params');
+
+async function show() {
+  const entry = manifest.views[view.value];
+  const values = [...params.querySelectorAll('select')].map((select, i) => entry.values[i][select.value]);
+  const path = entry.entries[JSON.stringify(values)];
+  const status = document.getElementById('status'), figures = document.getElementById('figures');
+  figures.replaceChildren();
+  if (!path) { status.textContent = 'No figure for this combination.'; return; }
+  status.textContent = '';
+  const body = await (await fetch(path)).json();
+  for (const figure of entry.multi ? body.map(spec => JSON.parse(spec)) : [body]) {
+    const div = document.createElement('div');
+    figures.appendChild(div);
+    Plotly.newPlot(div, figure);
+  }
+}
+
+function selectView() {
+  const entry = manifest.views[view.value];
+  params.replaceChildren(...entry.params.map((name, i) => {
+    const label = document.createElement('label'), select = document.createElement('select');
+    label.append(name, select);
+    entry.values[i].forEach((value, j) => select.add(new Option(value, j)));
+    select.onchange = show;
+    return label;
+  }));
+  show();
+}
+
+fetch('manifest.json').then(response => response.json()).then(loaded => {
+  manifest = loaded;
+  for (const name of Object.keys(manifest.views)) view.add(new Option(name, name));
+  view.onchange = selectView;
+  selectView();
+});
+</script></body></html>
+"""
+
+
+def serve(port):
+    """Serve the snapshots and a small Plotly viewer; every view is a static file."""
+    from plotly.offline import get_plotlyjs
+
+    manifest = read_manifest()
+    listed = {path for entry in manifest['views'].values() for path in entry['entries'].values()}
+    static = {
+        '/': ('text/html; charset=utf-8', gzip.compress(INDEX_HTML.encode())),
+        '/manifest.json': ('application/json', gzip.compress(MANIFEST_PATH.read_bytes())),
+        '/plotly.min.js': ('application/javascript', gzip.compress(get_plotlyjs().encode())),
+    }
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split('?')[0]
+            if path in static:
+                content_type, body = static[path]
+            elif path.lstrip('/') in listed:
+                content_type, body = 'application/json', (SNAPSHOT_DIR / path.lstrip('/')).read_bytes()
+            else:
+                self.send_error(404)
+                return
+            # Everything is stored compressed and sent as is
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('Cache-Control', 'public, max-age=3600')
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = http.server.ThreadingHTTPServer(('', port), Handler)
+    print(f"Serving {len(listed)} figures on http://localhost:{port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-render the dashboard's views and serve them statically.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build_parser = commands.add_parser('build', help="render every view combination into the snapshot directory")
+    build_parser.add_argument('--views', nargs='+', choices=list(VIEWS), help="views to build (default: all)")
+    serve_parser = commands.add_parser('serve', help="serve the built snapshots with a static viewer")
+    serve_parser.add_argument('--port', type=int, default=8502)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        build(args.views)
+    else:
+        serve(args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,94 +1,52 @@
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
-from sklearn.preprocessing import StandardScaler
-from sklearn.manifold import TSNE
 import numpy as np
 import calendar
 import pandas as pd
+import embeddings
+import figures
+import lazy
+from loaders import load_data
 
-milk_prices_df = "https://raw.githubusercontent.com/sbs24011/Streamlit/main/milk_prices_df_steamlit.csv"
-ireland_totals_by_product_group = "https://raw.githubusercontent.com/sbs24011/Streamlit/main/ireland_totals_by_product_group_steamlit.csv"
-ireland_totals_by_partner = "https://raw.githubusercontent.com/sbs24011/Streamlit/main/ireland_totals_by_partner_steamlit.csv"
-ireland_export_partners_2023 = "https://raw.githubusercontent.com/sbs24011/Streamlit/main/ireland_export_partners_2023_steamlit.csv"
-nl_totals_by_partners2023 = "https://raw.githubusercontent.com/sbs24011/Streamlit/main/nl_totals_by_partners2023_steamlit.csv"
-principal_components = "https://raw.githubusercontent.com/sbs24011/Streamlit/main/principal_components_steamlit.csv"
-challenge_other = "https://raw.githubusercontent.com/sbs24011/Streamlit/main/challenge_other_steamlit.csv"
-best_prediction_df = "https://raw.githubusercontent.com/sbs24011/Streamlit/main/best_prediction_df_steamlit.csv"
-#################################################################################
-
+st.set_page_config(layout="wide")
 
+# Chart libraries load when the first chart is built
+px = lazy.module('plotly.express')
+go = lazy.module('plotly.graph_objects')
+
+milk_prices_df = load_data("milk_prices_df")
+ireland_totals_by_product_group = load_data("ireland_totals_by_product_group")
+ireland_totals_by_partner = load_data("ireland_totals_by_partner")
+ireland_export_partners_2023 = load_data("ireland_export_partners_2023")
+nl_totals_by_partners2023 = load_data("nl_totals_by_partners2023")
+principal_components = load_data("principal_components")
+best_prediction_df = load_data("best_prediction_df")
+#################################################################################
 
+@st.cache_data
+def load_word_cloud(source_hash):
+    return embeddings.load_embeddings()
 
-st.set_page_config(layout="wide")
 
 # Create a midpoint for the color scale
 midpoint = 50
 
+# Animated maps send locations once and only per-year values in each frame
+PACK_FRAMES = True
+
 # First visualization
 st.header("Milk Prices in Europe (EUR)")
 
-initial_year = milk_prices_df['year'].min()
-df_initial = milk_prices_df[milk_prices_df['year'] == initial_year]
-
-fig1 = go.Figure()
-
-fig1.add_trace(go.Choropleth(
-    locations=df_initial['Country'],
-    z=df_initial['Raw milk price'],
-    locationmode='country names',
-    colorscale="Viridis",
-    zmid=midpoint,
-    zmin=25,
-    zmax=75,
-    name=f'Raw {initial_year}',
-    showscale=True,
-    hoverinfo="location+z"
-))
-fig1.add_trace(go.Choropleth(
-    locations=df_initial['Country'],
-    z=df_initial['Organic raw milk price'],
-    locationmode='country names',
-    colorscale="Viridis",
-    zmid=midpoint,
-    zmin=25,
-    zmax=75,
-    name=f'Organic {initial_year}',
-    showscale=True,
-    hoverinfo="location+z"
-))
-
-frames = []
-for year in sorted(milk_prices_df['year'].unique()):
-    df_year = milk_prices_df[milk_prices_df['year'] == year]
-    frames.append(go.Frame(
-        data=[
-            go.Choropleth(
-                locations=df_year['Country'],
-                z=df_year['Raw milk price'],
-                locationmode='country names',
-                colorscale="Viridis",
-                zmid=midpoint,
-                zmin=25,
-                zmax=75,
-                showscale=True,
-                hoverinfo="location+z"
-            ),
-            go.Choropleth(
-                locations=df_year['Country'],
-                z=df_year['Organic raw milk price'],
-                locationmode='country names',
-                colorscale="Viridis",
-                zmid=midpoint,
-                zmin=25,
-                zmax=75,
-                showscale=True,
-                hoverinfo="location+z"
-            )
-        ],
-        name=str(year)
-    ))
+# Locations are sent once; each yearly frame only carries the two z arrays
+fig1 = figures.animated_choropleth(milk_prices_df, 'year', 'Alpha-3code_Country',
+                                   ['Raw milk price', 'Organic raw milk price'], ['Raw milk', 'Organic milk'],
+                                   hover_column='Country',
+                                   packed=PACK_FRAMES,
+                                   colorscale="Viridis",
+                                   zmid=midpoint,
+                                   showscale=True,
+                                   hoverinfo="text+z")
+fig1.update_traces(zmin=25, zmax=75)
 
 fig1.update_layout(
     title_text="Milk Prices in Europe (EUR)",
@@ -137,8 +95,7 @@ fig1.update_layout(
     }]
 )
 
-fig1.update(frames=frames)
-
+figures.check_payload(fig1, "Milk Prices in Europe")
 st.plotly_chart(fig1)
 
 # Second visualization
@@ -146,8 +103,9 @@ st.header("Ireland's Export Quantity and Value Over the Years")
 
 fig2 = go.Figure()
 
-initial_year = ireland_totals_by_product_group['year'].min()
-df_initial = ireland_totals_by_product_group[ireland_totals_by_product_group['year'] == initial_year]
+product_group_years = figures.split_frames(ireland_totals_by_product_group, 'year')
+initial_year = min(product_group_years)
+df_initial = product_group_years[initial_year]
 
 fig2.add_trace(go.Bar(
     x=df_initial['ProductGroup'],
@@ -166,8 +124,7 @@ fig2.add_trace(go.Bar(
 ))
 
 frames = []
-for year in ireland_totals_by_product_group['year'].unique():
-    df_year = ireland_totals_by_product_group[ireland_totals_by_product_group['year'] == year]
+for year, df_year in product_group_years.items():
     frames.append(go.Frame(
         data=[
             go.Bar(
@@ -243,7 +200,7 @@ fig2.update_layout(
                 ],
                 'label': str(year),
                 'method': 'animate'
-            } for year in ireland_totals_by_product_group['year'].unique()
+            } for year in product_group_years
         ],
         'x': 0.1,
         'len': 0.9,
@@ -257,57 +214,22 @@ st.plotly_chart(fig2)
 # Third visualization
 st.header("Ireland Export Partners Over Time")
 
-fig_quantity = px.choropleth(ireland_totals_by_partner,
-                             locations="Alpha-3code_Partner",
-                             color="Quantityintonnes",
-                             hover_name="Partner",
-                             color_continuous_scale=px.colors.sequential.Plasma,
-                             animation_frame="year",
-                             animation_group="Partner",
-                             labels={"Quantityintonnes": "Quantity (Tonnes)", "Partner": "Export Partner"}
-                             )
-fig_quantity.update_layout(geo=dict(showframe=False, showcoastlines=False))
-
-fig_value = px.choropleth(ireland_totals_by_partner,
-                          locations="Alpha-3code_Partner",
-                          color="Valueinthousandeuro",
-                          hover_name="Partner",
-                          color_continuous_scale=px.colors.sequential.Plasma,
-                          animation_frame="year",
-                          animation_group="Partner",
-                          labels={"Valueinthousandeuro": "Value (EUR)", "Partner": "Export Partner"}
-                          )
-fig_value.update_layout(geo=dict(showframe=False, showcoastlines=False))
-
-fig3 = go.Figure()
-
-for data in fig_quantity.data:
-    fig3.add_trace(data)
-
-for data in fig_value.data:
-    fig3.add_trace(data)
-
-frames = []
-for year in ireland_totals_by_partner['year'].unique():
-    frame_data = []
-    for data in fig_quantity.frames:
-        if data.name == str(year):
-            frame_data.extend(data.data)
-    for data in fig_value.frames:
-        if data.name == str(year):
-            frame_data.extend(data.data)
-    frames.append(go.Frame(data=frame_data, name=str(year)))
-
-fig3.frames = frames
+fig3 = figures.animated_choropleth(ireland_totals_by_partner, 'year', 'Alpha-3code_Partner',
+                                   ['Quantityintonnes', 'Valueinthousandeuro'], ['Quantity (Tonnes)', 'Value (EUR)'],
+                                   hover_column='Partner',
+                                   packed=PACK_FRAMES,
+                                   colorscale=px.colors.sequential.Plasma,
+                                   hoverinfo="text+z")
+fig3.update_traces(visible=False, selector=dict(name='Value (EUR)'))
 
 dropdown_buttons = [
     {'label': 'Quantity (Tonnes)',
      'method': 'update',
-     'args': [{'visible': [True if i < len(fig_quantity.data) else False for i in range(len(fig3.data))]},
+     'args': [{'visible': [True, False]},
               {'title': 'Ireland Export Partners by Quantity (Tonnes) Over Time'}]},
     {'label': 'Value (EUR)',
      'method': 'update',
-     'args': [{'visible': [False if i < len(fig_quantity.data) else True for i in range(len(fig3.data))]},
+     'args': [{'visible': [False, True]},
               {'title': 'Ireland Export Partners by Value (EUR) Over Time'}]}
 ]
 
@@ -333,6 +255,7 @@ fig3.update_layout(
     ]
 )
 
+figures.check_payload(fig3, "Ireland Export Partners Over Time")
 st.plotly_chart(fig3)
 
 # Fourth visualization
@@ -365,17 +288,14 @@ fig_ml = go.Figure()
 colors = ['blue', 'green', 'red', 'orange', 'purple']
 shapes = ['circle', 'square', 'diamond', 'cross', 'x']
 
-for i, ((cluster, words), color, shape) in enumerate(zip(top_keywords_kmeans.items(), colors, shapes), start=1):
-    word_vectors = generate_word_vectors(words)
-    scaler = StandardScaler()
-    word_vectors = scaler.fit_transform(word_vectors)
-    perplexity = min(50, len(words) - 1)
-    coordinates = get_tsne_coordinates(word_vectors, perplexity)
-    coordinates = add_jitter(coordinates, jitter=0.2)
-    
+# Coordinates come from the offline stage in embeddings.py (t-SNE is not fitted here)
+word_cloud = load_word_cloud(embeddings.source_hash())
+
+for (cluster, cluster_words), color, shape in zip(word_cloud.groupby('Cluster'), colors, shapes):
+    words = cluster_words['Word'].tolist()
     fig_ml.add_trace(go.Scatter(
-        x=coordinates[:, 0],
-        y=coordinates[:, 1],
+        x=cluster_words['x'],
+        y=cluster_words['y'],
         mode='markers+text',
         marker=dict(size=12, opacity=0.7, color=color, symbol=shape),
         text=words,
@@ -399,12 +319,8 @@ st.plotly_chart(fig_ml)
 # Additional Machine Learning visualization
 st.header("PCA of Clusters with Top Words")
 
-df_pca = pd.DataFrame(data=principal_components, columns=['PC1', 'PC2'])
-df_pca['Cluster'] = kmeans.labels_
-df_pca['Text'] = challenge_other.values
-df_pca['Top_Words'] = df_pca['Cluster'].map(lambda x: ', '.join(top_keywords_kmeans[f'Cluster {x}']))
-
-df_pca['customdata'] = df_pca.apply(lambda row: [row['Top_Words'], row['Text']], axis=1)
+# PC1/PC2, Cluster, Text and Top_Words are stored precomputed in principal_components_steamlit.csv
+df_pca = principal_components
 
 fig_pca = px.scatter(df_pca, x='PC1', y='PC2', color='Cluster', 
                      custom_data=['Top_Words', 'Text'], 
@@ -430,7 +346,7 @@ month_names = {month: calendar.month_name[month] for month in unique_months}
 
 country = st.selectbox("Select Country", best_prediction_df['Partner'].unique())
 limit = st.selectbox("Select Limit", [5, 10, 20, -1], format_func=lambda x: "No limit" if x == -1 else f"Top {x} products")
-month = st.slider("Select Month", 0, len(unique_months) - 1, 0, format_func=lambda x: month_names[unique_months[x]])
+month = st.select_slider("Select Month", options=list(range(len(unique_months))), format_func=lambda x: month_names[unique_months[x]])
 
 filtered_df = best_prediction_df[
     (best_prediction_df['month'] == unique_months[month]) &
@@ -443,22 +359,13 @@ if limit != -1:
 
 filtered_df = filtered_df.sort_values(by='RF_ForecastedQuantity', ascending=False)
 
-fig_dash = go.Figure()
-for product_group in filtered_df['ProductGroup'].unique():
-    product_group_df = filtered_df[filtered_df['ProductGroup'] == product_group]
-    rounded_quantity = round(product_group_df["RF_ForecastedQuantity"].values[0], 2)
-    fig_dash.add_trace(go.Bar(
-        x=[product_group],
-        y=product_group_df['RF_ForecastedQuantity'],
-        name=product_group,
-        hovertemplate=f'{product_group}: {rounded_quantity}<extra></extra>'
-    ))
+# One trace for all product groups; past figures.MAX_CATEGORIES the tail becomes "Other"
+fig_dash = figures.bar_figure(filtered_df, 'ProductGroup', 'RF_ForecastedQuantity', palette=px.colors.qualitative.Plotly)
 
 fig_dash.update_layout(
     title=f'Forecasted Export Quantity for {month_names[unique_months[month]]} {unique_years[0]}',
     xaxis_title='Products',
     yaxis_title='Forecasted Quantity',
-    barmode='group',
     xaxis=dict(tickangle=-90)
 )
 
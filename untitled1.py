@@ -1,24 +1,19 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+import lazy
+from loaders import load_data
 
-# Corrected caching decorator
-@st.cache
-def load_data(url):
-    return pd.read_csv(url)
+# Chart libraries load when the first chart is built
+px = lazy.module('plotly.express')
+go = lazy.module('plotly.graph_objects')
 
 # UI Elements
 year_options = list(range(2023, 2010, -1))
 selected_year = st.selectbox("Select Year", year_options)
 
-# Data URLs
-imports_url = "https://raw.githubusercontent.com/sbs24011/Streamlit/main/ireland_imports.csv"
-exports_url = "https://raw.githubusercontent.com/sbs24011/Streamlit/main/ireland_exports.csv"
-
 # Load Data
-imports_data = load_data(imports_url)
-exports_data = load_data(exports_url)
+imports_data = load_data("imports_data")
+exports_data = load_data("exports_data")
 
 # Ensure data is loaded
 if imports_data is not None and exports_data is not None:
@@ -31,7 +26,7 @@ if imports_data is not None and exports_data is not None:
     def plot_data(data, title, color):
         st.subheader(title)
         filtered_data = data[(data['ProductGroup'] == selected_product_group) & (data['year'] == selected_year)]
-        summary = filtered_data.groupby('Partner')['Quantityintonnes'].sum().reset_index()
+        summary = filtered_data.groupby('Partner', observed=True)['Quantityintonnes'].sum().reset_index()
         summary = summary.sort_values(by='Quantityintonnes', ascending=False)
         if selected_max_results != 'No Limit':
             summary = summary.head(int(selected_max_results))
@@ -47,10 +42,10 @@ else:
     st.error("Failed to load data. Please check the data URLs and format.")
 
 try:
-    ireland_totals_by_partner = load_data("https://raw.githubusercontent.com/sbs24011/Streamlit/main/ireland_totals_by_partner.csv")
-    ireland_export_partners_2023 = load_data("https://raw.githubusercontent.com/sbs24011/Streamlit/main/ireland_export_partners_2023.csv")
-    nl_totals_by_partners2023 = load_data("https://raw.githubusercontent.com/sbs24011/Streamlit/main/nl_totals_by_partners2023.csv")
-    best_prediction_df = load_data("https://raw.githubusercontent.com/sbs24011/Streamlit/main/best_prediction_df.csv")
+    ireland_totals_by_partner = load_data("ireland_totals_by_partner")
+    ireland_export_partners_2023 = load_data("ireland_export_partners_2023")
+    nl_totals_by_partners2023 = load_data("nl_totals_by_partners2023")
+    best_prediction_df = load_data("best_prediction_df")
 except Exception as e:
     st.error(f"Failed to load some datasets: {str(e)}")
 
@@ -84,6 +79,8 @@ if best_prediction_df is not None:
 
     if selected_limit != -1:
         filtered_df = filtered_df.nlargest(selected_limit, 'RF_ForecastedQuantity')
+    # Plotly groups by color, so only keep the product groups actually plotted
+    filtered_df = filtered_df.assign(ProductGroup=filtered_df['ProductGroup'].cat.remove_unused_categories())
 
     fig_forecast = px.bar(filtered_df, x='ProductGroup', y='RF_ForecastedQuantity', color='ProductGroup',
                           title=f'Forecasted Export Quantity for {month_names[unique_months[selected_month]]} {unique_years[0]}')
@@ -0,0 +1,169 @@
+"""Figure builders for the dashboard's parameterized views.
+
+Each function turns prebuilt structures (partner cube, range index, ...)
+plus a view's widget values into serialized figure JSON. The live app and
+the snapshot builder (snapshots.py) share them, so a pre-rendered view is
+exactly what the app would have drawn.
+"""
+import calendar
+
+import aggregates
+import comparison
+import figures
+import instrumentation
+import lazy
+
+go = lazy.module('plotly.graph_objects')
+px = lazy.module('plotly.express')
+
+# Widget options; snapshots.py pre-renders every combination of them
+YEAR_OPTIONS = list(range(2023, 2010, -1))
+MAX_RESULTS = ['No Limit', '5', '10', '20']
+# Trade chart label -> dataset it is drawn from
+TRADE_DATASETS = {'Imports': 'imports_data', 'Exports': 'exports_data'}
+TRADE_COLORS = {'Imports': '#1f77b4', 'Exports': '#ff7f0e'}
+PARTNER_MAP_METRICS = {
+    'Value in thousand euro': 'Valueinthousandeuro',
+    'Quantity in tonnes': 'Quantityintonnes',
+    'Value per tonne': 'Value_per_tonne',
+    'Share of export value': 'Value_share',
+    'Value change on previous year': 'Value_yoy',
+}
+MILK_TYPES = ['Raw', 'Organic raw']
+FORECAST_LIMITS = [5, 10, 20, -1]
+MONTH_NAMES = {month: calendar.month_name[month] for month in range(1, 13)}
+
+# Running totals per partner / product group: a year-range total is two column lookups
+RANGE_MEASURES = ['Quantityintonnes', 'Valueinthousandeuro']
+
+
+def partner_ranges(data):
+    return aggregates.build_range_index(data, ['Partner', 'Alpha-3code_Partner'], RANGE_MEASURES)
+
+
+def product_group_ranges(data):
+    return aggregates.build_range_index(data, ['ProductGroup'], RANGE_MEASURES)
+
+
+def trade_title(label, product_group, year):
+    return f"{label} of {product_group} in {year}"
+
+
+def trade_chart(cube, label, product_group, year, max_results):
+    limit = None if max_results == 'No Limit' else int(max_results)
+    with instrumentation.measure(f"trade-{label}", 'filter') as record:
+        summary = aggregates.top_partners(cube, label, product_group, year, limit)
+        record['rows'] = len(summary)
+    with instrumentation.measure(f"trade-{label}", 'figure') as record:
+        chart = figures.bar_figure(summary, 'Partner', 'Quantityintonnes', trade_title(label, product_group, year),
+                                   orientation='h', color=TRADE_COLORS[label])
+        spec = figures.figure_to_json(chart)
+        record['bytes'] = len(spec)
+    return spec
+
+
+def partner_map(data, version, metric):
+    return figures.partner_map_frames_json(data, version, f"Ireland Export Partners by {metric}",
+                                           color=PARTNER_MAP_METRICS[metric])
+
+
+def partner_range_map(ranges, first_year, last_year):
+    with instrumentation.measure("partner-range-map", 'filter') as record:
+        range_data = aggregates.range_totals(ranges, first_year, last_year)
+        range_data = range_data[range_data['Valueinthousandeuro'] > 0]
+        record['rows'] = len(range_data)
+    return figures.figure_to_json(figures.choropleth(
+        range_data, 'Alpha-3code_Partner', 'Valueinthousandeuro',
+        f"Ireland Export Partners by Value in thousand euro ({first_year}–{last_year})", hover_column='Partner'))
+
+
+def product_group_chart(ranges, first_year, last_year):
+    with instrumentation.measure("product-groups", 'filter') as record:
+        totals = aggregates.range_totals(ranges, first_year, last_year)
+        totals['Value_per_tonne'] = totals['Valueinthousandeuro'] / totals['Quantityintonnes']
+        record['rows'] = len(totals)
+
+    years_label = str(first_year) if first_year == last_year else f"{first_year}–{last_year}"
+    figure = go.Figure()
+    figure.add_trace(
+        go.Bar(
+            x=totals['ProductGroup'],
+            y=totals['Quantityintonnes'],
+            name='Quantity in tonnes',
+            yaxis='y1',
+            marker=dict(color='rgba(54, 162, 235, 0.6)')
+        )
+    )
+
+    # Value per tonne on the right y-axis
+    figure.add_trace(
+        go.Bar(
+            x=totals['ProductGroup'],
+            y=totals['Value_per_tonne'],
+            name='Value per tonne (Euro)',
+            yaxis='y2',
+            marker=dict(color='rgba(255, 99, 71, 0.6)')
+        )
+    )
+
+    # Update the layout for dual y-axes
+    figure.update_layout(
+        title=f'Product Group Data for {years_label}',
+        xaxis_title='Product Group',
+        yaxis=dict(
+            title='Quantity in tonnes',
+            range=[0, 300000 * (last_year - first_year + 1)],
+            titlefont=dict(color='#1f77b4'),
+            tickfont=dict(color='#1f77b4')
+        ),
+        yaxis2=dict(
+            title='Value per tonne',
+            range=[0, 20],
+            titlefont=dict(color='#ff7f0e'),
+            tickfont=dict(color='#ff7f0e'),
+            overlaying='y',
+            side='right'
+        ),
+        legend=dict(x=0.1, y=1.1, orientation='h')
+    )
+
+    with instrumentation.measure("product-groups", 'figure') as record:
+        spec = figures.figure_to_json(figure)
+        record['bytes'] = len(spec)
+    return spec
+
+
+def comparison_maps(matrix, reporter_a, reporter_b, year):
+    """Both reporters' partner maps and their difference map, as a list of specs."""
+    with instrumentation.measure("comparison", 'filter') as record:
+        compared = comparison.compare(matrix, reporter_a, reporter_b, year)
+        record['rows'] = len(compared)
+    with instrumentation.measure("comparison", 'figure') as record:
+        specs = [figures.figure_to_json(figures.choropleth(
+                     compared, 'Alpha-3code_Partner', reporter,
+                     f"{reporter} Export Partners by Value in thousand euro in {year}", hover_column='Partner'))
+                 for reporter in (reporter_a, reporter_b)]
+        specs.append(figures.figure_to_json(figures.choropleth(
+            compared, 'Alpha-3code_Partner', 'Difference',
+            f"{reporter_a} minus {reporter_b}, value in thousand euro ({year})",
+            hover_column='Partner', colorscale='RdBu', zmid=0)))
+        record['bytes'] = sum(len(spec) for spec in specs)
+    return specs
+
+
+def milk_price_map(data, version, milk_type):
+    return figures.milk_price_frames_json(data, version, milk_type)
+
+
+def forecast_chart(index, partner, year, month, limit):
+    with instrumentation.measure("forecast", 'filter') as record:
+        filtered_df = aggregates.top_forecasts(index, partner, year, month, None if limit == -1 else limit)
+        record['rows'] = len(filtered_df)
+
+    with instrumentation.measure("forecast", 'figure') as record:
+        fig_forecast = figures.bar_figure(filtered_df, 'ProductGroup', 'RF_ForecastedQuantity',
+                                          f'Forecasted Export Quantity for {MONTH_NAMES[month]} {year}',
+                                          palette=px.colors.qualitative.Plotly)
+        spec = figures.figure_to_json(fig_forecast)
+        record['bytes'] = len(spec)
+    return spec